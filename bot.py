@@ -2,7 +2,7 @@
 
 import time
 import threading
-import copy
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Optional, List
 from modules.adventure import Module as AdventureModule
 from modules.hero import Module as HeroModule
@@ -12,10 +12,16 @@ from modules.demolish import Module as DemolishModule
 from modules.smithyupgrades import Module as SmithyModule
 from modules.loop import Module as LoopModule
 from client import TravianClient
-from config import log, BOT_STATE, state_lock, save_config
+from config import log, BOT_STATE, state_lock, save_config, json_dumps, state_dirty, mark_state_dirty
 from modules import load_modules
 from proxy_util import test_proxy
 
+# Workers for account-level ticks (adventure/hero), so one slow account does not hold up the rest
+_ACCOUNT_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="account-tick")
+
+UI_EMIT_INTERVAL = 0.25   # seconds between coalesced state_update emits
+UI_HEARTBEAT_INTERVAL = 5 # seconds between full state resyncs, which also catch writes that never marked the state dirty
+
 class VillageAgent(threading.Thread):
     def __init__(self, account_info: Dict, village_info: Dict, socketio_instance, is_special_agent=False):
         super().__init__()
@@ -26,6 +32,8 @@ class VillageAgent(threading.Thread):
             account_info.get("proxy")
         )
         self.village_id = village_info['id']
+        # BOT_STATE is keyed by the string id; computed once instead of on every lookup
+        self.village_key = str(self.village_id)
         self.village_name = village_info['name']
         self.socketio = socketio_instance
         self.tribe = account_info.get("tribe", "roman")
@@ -50,7 +58,8 @@ class VillageAgent(threading.Thread):
             with state_lock:
                 # Assign the "task_focused" build order
                 task_focused_build_order = BOT_STATE.get("build_templates", {}).get("Task_Focused", [])
-                BOT_STATE["build_queues"][str(self.village_id)] = copy.deepcopy(task_focused_build_order)
+                # Tasks are flat dicts, so per-task copies are enough to detach from the template
+                BOT_STATE["build_queues"][self.village_key] = [dict(task) for task in task_focused_build_order]
             save_config()
             
         log.info(f"Agent started for village: {self.village_name} ({self.village_id})")
@@ -73,27 +82,24 @@ class VillageAgent(threading.Thread):
                     self.next_check_time = time.time() + 10
                     continue
                 
+                # Fetch the training/smithy pages first; the lock is only held for the dict updates below
+                present_gids = {b.get('gid') for b in village_data.get('buildings', [])}
+                training_gids = [19, 20, 21, 29, 30] # Barracks, Stable, etc.
+                training_pages = {}
+                for gid in training_gids:
+                    if gid in present_gids:
+                        training_page_data = self.client.get_training_page(self.village_id, gid)
+                        if training_page_data:
+                            training_pages[str(gid)] = training_page_data
+
+                smithy_page_data = self.client.get_smithy_page(self.village_id, 13) if 13 in present_gids else None
+
                 with state_lock:
-                    if str(self.village_id) not in BOT_STATE['training_data']:
-                        BOT_STATE['training_data'][str(self.village_id)] = {}
-                    
-                    training_gids = [19, 20, 21, 29, 30] # Barracks, Stable, etc.
-                    for gid in training_gids:
-                        if any(b['gid'] == gid for b in village_data.get('buildings', [])):
-                            training_page_data = self.client.get_training_page(self.village_id, gid)
-                            if training_page_data:
-                                BOT_STATE['training_data'][str(self.village_id)][str(gid)] = training_page_data
-
-                    smithy_building = next((b for b in village_data.get('buildings', []) if b.get('gid') == 13), None)
-
-                    if smithy_building:
-                        smithy_page_data = self.client.get_smithy_page(self.village_id, 13)
-                        if smithy_page_data:
-                            with state_lock:
-                                BOT_STATE['smithy_data'][str(self.village_id)] = smithy_page_data
-                
-                with state_lock:
-                    BOT_STATE["village_data"][str(self.village_id)] = village_data
+                    BOT_STATE['training_data'].setdefault(self.village_key, {}).update(training_pages)
+                    if smithy_page_data:
+                        BOT_STATE['smithy_data'][self.village_key] = smithy_page_data
+                    BOT_STATE["village_data"][self.village_key] = village_data
+                mark_state_dirty()
 
                 for module in self.modules:
                     if module == self.building_module:
@@ -153,7 +159,7 @@ class VillageAgent(threading.Thread):
                 final_data = self.client.fetch_and_parse_village(self.village_id)
                 if final_data and final_data.get("queue"):
                     with state_lock:
-                        if BOT_STATE["build_queues"].get(str(self.village_id)):
+                        if BOT_STATE["build_queues"].get(self.village_key):
                             self.next_check_time = time.time() + 10
                             log.info(f"[{self.village_name}] Local queue is active. Next check in 10s.")
                         else:
@@ -163,7 +169,7 @@ class VillageAgent(threading.Thread):
                             log.info(f"[{self.village_name}] Construction active. Next main check in {wait_time:.0f}s.")
                 else:
                     with state_lock:
-                        if BOT_STATE["build_queues"].get(str(self.village_id)):
+                        if BOT_STATE["build_queues"].get(self.village_key):
                              self.next_check_time = time.time() + 10
                              log.info(f"[{self.village_name}] No construction, but local queue exists. Next check in 10s.")
                         else:
@@ -192,25 +198,72 @@ class BotManager(threading.Thread):
         self.hero_module = HeroModule(self)
         self.daemon = True
         self._ui_updater_thread = threading.Thread(target=self._ui_updater, daemon=True)
+        self._sent_hashes: Dict[str, int] = {}
 
     def _ui_updater(self):
         log.info("UI Updater thread started.")
+        last_full_emit = 0.0
         while not self.stop_event.is_set():
-            with state_lock:
+            full_resync = time.time() - last_full_emit >= UI_HEARTBEAT_INTERVAL
+            if state_dirty.is_set() or full_resync:
                 try:
-                    self.socketio.emit("state_update", copy.deepcopy(BOT_STATE))
+                    with state_lock.read():
+                        state_dirty.clear()
+                        # Keeps the sent hashes current even when the whole state goes out below
+                        updates = self._collect_state_deltas()
+                        if full_resync:
+                            updates = [("state_update", json_dumps(BOT_STATE))]
+                    for event, payload in updates:
+                        self.socketio.emit(event, payload)
                 except Exception as e:
                     log.error(f"Error in UI updater: {e}", exc_info=True)
-            self.stop_event.wait(2) 
+                if full_resync:
+                    last_full_emit = time.time()
+            self.stop_event.wait(UI_EMIT_INTERVAL)
         log.info("UI Updater thread stopped.")
 
+    def _collect_state_deltas(self) -> List[tuple]:
+        """
+        Serializes BOT_STATE piece by piece and returns (event, json) pairs for the
+        pieces whose content changed since the last emit. Must be called under state_lock.
+        Clients receive the full state once on connect and merge these deltas into it.
+        """
+        updates = []
+        seen = set()
+        for key, value in BOT_STATE.items():
+            if key == "village_data":
+                for vid, data in value.items():
+                    data_json = json_dumps(data)
+                    hash_key = f"village_data:{vid}"
+                    seen.add(hash_key)
+                    if self._sent_hashes.get(hash_key) != hash(data_json):
+                        self._sent_hashes[hash_key] = hash(data_json)
+                        updates.append(("village_update", f'{{"village_id":{json_dumps(str(vid))},"data":{data_json}}}'))
+                continue
+            value_json = json_dumps(value)
+            seen.add(key)
+            if self._sent_hashes.get(key) == hash(value_json):
+                continue
+            self._sent_hashes[key] = hash(value_json)
+            if key == "accounts":
+                updates.append(("accounts_update", value_json))
+            else:
+                updates.append(("state_patch", f'{{"key":{json_dumps(key)},"data":{value_json}}}'))
+
+        for hash_key in set(self._sent_hashes) - seen:
+            del self._sent_hashes[hash_key]
+            if hash_key.startswith("village_data:"):
+                vid = hash_key.split(":", 1)[1]
+                updates.append(("village_update", f'{{"village_id":{json_dumps(vid)},"data":null}}'))
+        return updates
+
     def stop(self):
         log.info("Stopping Bot Manager and all active agents...")
         self.stop_event.set()
         with state_lock:
             for acc in BOT_STATE['accounts']:
                 acc['active'] = False
-            save_config()
+        save_config()
             
         for username in list(self.running_account_agents.keys()):
             self._stop_agents_for_account(username)
@@ -267,7 +320,7 @@ class BotManager(threading.Thread):
 
         while not self.stop_event.is_set():
             try:
-                with state_lock:
+                with state_lock.read():
                     accounts = [acc.copy() for acc in BOT_STATE["accounts"]]
 
                 active_usernames = {acc['username'] for acc in accounts if acc.get('active')}
@@ -281,23 +334,31 @@ class BotManager(threading.Thread):
                 for username_to_stop in running_usernames - active_usernames:
                     self._stop_agents_for_account(username_to_stop)
                 
+                futures = {}
                 for username in active_usernames:
                     client = self.running_account_clients.get(username)
                     if client:
-                        try:
-                            self.adventure_module.tick(client)
-                            time.sleep(1) 
-                            self.hero_module.tick(client)
-                        except Exception as e:
-                            log.error(f"Error in account-level module for {username}: {e}", exc_info=True)
+                        futures[_ACCOUNT_POOL.submit(self._tick_account_modules, client)] = username
                     else:
                         log.debug(f"No active client found for running account {username}. It may be starting.")
 
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        log.error(f"Error in account-level module for {futures[future]}: {e}", exc_info=True)
+
             except Exception as e:
                 log.error(f"Critical error in BotManager loop: {e}", exc_info=True)
 
             self.stop_event.wait(10)
 
+    def _tick_account_modules(self, client: TravianClient):
+        """Runs the account-level modules for one account; executed on the account pool."""
+        self.adventure_module.tick(client)
+        time.sleep(1)
+        self.hero_module.tick(client)
+
     def start_agents_for_account(self, account_info: Dict):
         username = account_info['username']
         log.info(f"Attempting to start agents for account: {username}")
@@ -333,8 +394,7 @@ class BotManager(threading.Thread):
 
         try:
             resp = persistent_client.sess.get(f"{persistent_client.server_url}/dorf1.php", timeout=15)
-            sidebar_data = persistent_client.parse_village_page(resp.text, "dorf1")
-            villages = sidebar_data.get("villages", [])
+            villages = persistent_client.parse_villages_sidebar(resp.text)
 
             self.socketio.emit('villages_discovered', {'username': username, 'villages': villages})
 
@@ -362,7 +422,8 @@ class BotManager(threading.Thread):
                             "priority": []
                         }
                         config_updated = True
-                if config_updated: save_config()
+            if config_updated: save_config()
+            else: mark_state_dirty()
             
             log.info(f"Starting dedicated training agent for {username}")
             training_agent = TrainingModule(account_info, TravianClient)
@@ -394,7 +455,7 @@ class BotManager(threading.Thread):
     def start_special_agent_for_village(self, account_username: str, village_id: int):
         """Starts a temporary agent for a newly settled village."""
         log.info(f"BotManager received request to start SPECIAL AGENT for village {village_id}")
-        with state_lock:
+        with state_lock.read():
             account_info = next((acc for acc in BOT_STATE['accounts'] if acc['username'] == account_username), None)
             # The new village might not be in the main village_data yet, so we create a temporary entry
             village_info = {'id': village_id, 'name': f"New Village {village_id}"}
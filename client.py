@@ -1,13 +1,27 @@
 # client.py
 
 import re
+import sys
 import json
+import copy
+import hashlib
 import requests
+import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, List, Tuple
-from bs4 import BeautifulSoup
+import html as html_lib
+import soupsieve as sv
+from bs4 import BeautifulSoup, SoupStrainer
 from urllib.parse import urljoin, parse_qs, urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import pyjson5
+except ImportError:
+    pyjson5 = None
 
 from config import log, gid_name, NAME_TO_GID
 
@@ -53,7 +67,46 @@ from typing import Dict, Any, Optional, List, Tuple
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, parse_qs, urlencode
 
-from config import log, gid_name, NAME_TO_GID, state_lock, BOT_STATE
+from config import log, gid_name, NAME_TO_GID, state_lock, BOT_STATE, json_loads, HTML_PARSER
+
+# ─────────────────────────────────────────
+# PRECOMPILED PATTERNS (village page parser)
+# ─────────────────────────────────────────
+_RE_RESOURCES_OBJ = re.compile(r"var\s+resources\s*=\s*(\{.*?\});", re.DOTALL)
+# Matches a double-quoted string literal (kept as-is) or a bare object key (quoted)
+_RE_JS_KEY_OR_STRING = re.compile(r'("(?:[^"\\]|\\.)*")|([A-Za-z_]\w*)(\s*:)')
+_RE_NEWDID_HREF = re.compile(r"newdid=")
+_RE_NEWDID = re.compile(r"newdid=(\d+)")
+_RE_BUILD_ID = re.compile(r"id=(\d+)")
+_RE_GID_CLASS = re.compile(r"^gid(\d+)$")
+_RE_FIRST_INT = re.compile(r"\d+")
+_RE_HTML_TAG = re.compile(r"<[^>]+>")
+
+_SEL_VILLAGE_ENTRIES = sv.compile("#sidebarBoxVillageList .listEntry")
+_SEL_RESOURCE_SLOTS = sv.compile('#resourceFieldContainer a[href*="build.php?id="]')
+_SEL_BUILDING_SLOTS = sv.compile("#villageContent > .buildingSlot")
+_SEL_BUILDING_LEVEL = sv.compile("a.level[data-level]")
+_SEL_BUILD_QUEUE = sv.compile(".buildingList li")
+
+def _quote_js_key(match: "re.Match") -> str:
+    if match.group(1):
+        return match.group(1)
+    return f'"{match.group(2)}"{match.group(3)}'
+
+def parse_js_object(raw: str) -> Any:
+    """Parses a JavaScript object literal with unquoted keys."""
+    if pyjson5 is not None:
+        try:
+            return pyjson5.loads(raw)
+        except Exception:
+            pass
+    return json_loads(_RE_JS_KEY_OR_STRING.sub(_quote_js_key, raw))
+
+# Shared pool that fetches and parses dorf1/dorf2 of a village at the same time.
+_PAGE_FETCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="page-fetch")
+
+# Sessions older than this are re-authenticated before a cached client is handed out
+SESSION_MAX_AGE = 20 * 60
 
 class TravianClient:
     """Lightweight HTTP wrapper around the Travian *HTML* and JSON endpoints."""
@@ -63,6 +116,15 @@ class TravianClient:
         self.password = password
         self.server_url = server_url.rstrip("/")
         self.sess = requests.Session()
+        # Keep TCP/TLS connections alive across requests. Only failed connects are retried: game actions
+        # are sent as GETs, so resending after a read timeout could repeat an action the server already took.
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                              max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3))
+        self.sess.mount("https://", adapter)
+        self.sess.mount("http://", adapter)
+        self.logged_in_at: Optional[float] = None
+        # url -> (ETag, content digest, parsed page) for skipping re-parses of unchanged pages
+        self._page_cache: Dict[str, Tuple[Optional[str], str, Dict[str, Any]]] = {}
         self.sess.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
         })
@@ -222,7 +284,7 @@ class TravianClient:
             return False
 
     def login(self) -> bool:
-        with state_lock:
+        with state_lock.read():
             account_config = next((acc for acc in BOT_STATE.get("accounts", []) if acc['username'] == self.username), None)
 
         login_username = self.username
@@ -246,13 +308,21 @@ class TravianClient:
                 log.info("[%s] Logged in successfully ✔", login_username)
 
                 if account_config and account_config.get("is_sitter") and account_config.get("sitter_for"):
-                    return self.switch_to_sitter(account_config["sitter_for"])
+                    if not self.switch_to_sitter(account_config["sitter_for"]):
+                        return False
 
+                self.logged_in_at = time.time()
                 return True
         except Exception as exc:
             log.error("[%s] Login process failed with an exception: %s", login_username, exc)
         return False
 
+    def ensure_logged_in(self) -> bool:
+        """Logs in only if this client has no session yet or the session is getting old."""
+        if self.logged_in_at and time.time() - self.logged_in_at < SESSION_MAX_AGE:
+            return True
+        return self.login()
+
     def initiate_build(self, village_id: int, slot_id: int, gid: int, is_new_build: bool) -> Dict[str, Any]:
         log.info(f"[{self.username}] Attempting to build GID {gid_name(gid)} ({gid}) at slot {slot_id} (New Build: {is_new_build})")
         action_url, build_page_url = None, f"{self.server_url}/build.php?newdid={village_id}&id={slot_id}"
@@ -304,21 +374,39 @@ class TravianClient:
         except requests.RequestException as e:
             return {'status': 'error', 'reason': f'Network error: {e}'}
 
+    def _fetch_and_parse_page(self, url: str, page_type: str) -> Dict[str, Any]:
+        """
+        Fetches and parses one village page; runs on the page pool so the two
+        dorf pages are downloaded and parsed side by side. Unchanged pages
+        (304 or identical bytes) reuse the previous parse.
+        """
+        cached = self._page_cache.get(url)
+        headers = {"If-None-Match": cached[0]} if cached and cached[0] else {}
+        resp = self.sess.get(url, timeout=15, headers=headers)
+        if resp.status_code == 304 and cached:
+            return copy.deepcopy(cached[2])
+        digest = hashlib.blake2b(resp.content, digest_size=16).hexdigest()
+        if cached and cached[1] == digest:
+            return copy.deepcopy(cached[2])
+        parsed = self.parse_village_page(resp.text, page_type)
+        if page_type == "dorf1":
+            parsed["merchants"] = self.parse_merchants(resp.text)
+        self._page_cache[url] = (resp.headers.get("ETag"), digest, copy.deepcopy(parsed))
+        return parsed
+
     def fetch_and_parse_village(self, village_id: int) -> Optional[Dict[str, Any]]:
         log.info("[%s] Fetching data for village %d", self.username, village_id)
         try:
             url_d1 = f"{self.server_url}/dorf1.php?newdid={village_id}"
-            resp_d1 = self.sess.get(url_d1, timeout=15)
-            village_data = self.parse_village_page(resp_d1.text, "dorf1")
             url_d2 = f"{self.server_url}/dorf2.php?newdid={village_id}"
-            resp_d2 = self.sess.get(url_d2, timeout=15)
-            parsed_d2 = self.parse_village_page(resp_d2.text, "dorf2")
+            fut_d1 = _PAGE_FETCH_POOL.submit(self._fetch_and_parse_page, url_d1, "dorf1")
+            fut_d2 = _PAGE_FETCH_POOL.submit(self._fetch_and_parse_page, url_d2, "dorf2")
+            village_data, parsed_d2 = fut_d1.result(), fut_d2.result()
             final_buildings = {b['id']: b for b in village_data.get("buildings", [])}
             for building in parsed_d2.get("buildings", []):
                 final_buildings[building['id']] = building
             village_data["buildings"] = list(final_buildings.values())
             village_data["queue"] = parsed_d2.get("queue", [])
-            village_data["merchants"] = self.parse_merchants(resp_d1.text)
             return village_data
         except requests.RequestException as e:
             log.error(f"Network error fetching village data for {village_id}: {e}")
@@ -343,55 +431,46 @@ class TravianClient:
         return merchants_data
 
     def parse_village_page(self, html: str, page_type: str) -> Dict[str, Any]:
-        soup = BeautifulSoup(html, "html.parser")
+        soup = BeautifulSoup(html, HTML_PARSER)
         out: Dict[str, Any] = {"resources": {}, "storage": {}, "production": {}, "buildings": [], "queue": [], "villages": [], "coords": {}}
         try:
-            # Get coordinates from the active village list
-            active_village_entry = soup.select_one("#sidebarBoxVillageList .listEntry.active")
-            if active_village_entry:
-                coord_span = active_village_entry.select_one(".coordinates")
-                if coord_span:
-                    x = coord_span.select_one(".coordinateX").text.strip('()')
-                    y = coord_span.select_one(".coordinateY").text.strip('()')
-                    out["coords"] = {'x': int(x), 'y': int(y)}
-
-            if script_text := soup.find("script", string=re.compile(r"var\s+resources\s*=")):
-                if match := re.search(r"var\s+resources\s*=\s*(\{.*?\});", script_text.string, re.DOTALL):
-                    json_str = re.sub(r'([a-zA-Z_][\w]*)\s*:', r'"\1":', match.group(1))
-                    res_data = json.loads(json_str)
-                    out.update({
-                        "resources": {k: int(v) for k, v in res_data.get("storage", {}).items()},
-                        "storage": {k: int(v) for k, v in res_data.get("maxStorage", {}).items()},
-                        "production": {k: int(v) for k, v in res_data.get("production", {}).items()}
-                    })
+            # The resources object lives in an inline script; scanning the raw page avoids a soup walk over every <script>
+            if match := _RE_RESOURCES_OBJ.search(html):
+                res_data = parse_js_object(match.group(1))
+                out.update({
+                    "resources": {k: int(v) for k, v in res_data.get("storage", {}).items()},
+                    "storage": {k: int(v) for k, v in res_data.get("maxStorage", {}).items()},
+                    "production": {k: int(v) for k, v in res_data.get("production", {}).items()}
+                })
         except Exception as exc: log.debug(f"Resource javascript parser failed: {exc}")
         found_buildings = {}
-        if container := soup.find(id="resourceFieldContainer"):
-            for slot in container.select('a[href*="build.php?id="]'):
-                try:
-                    loc_id = int(re.search(r'id=(\d+)', slot['href']).group(1))
-                    gid_class = next((c for c in slot.get('class', []) if c.startswith('gid') and c[3:].isdigit()), None)
-                    if not gid_class: continue
-                    gid = int(gid_class[3:])
-                    level = int(slot.find('div', class_='labelLayer').text.strip() or 0)
-                    name = BeautifulSoup(slot.get('title', ''), 'html.parser').get_text().split('||')[0].strip()
-                    found_buildings[loc_id] = {'id': loc_id, 'gid': gid, 'level': level, 'name': name}
-                except Exception: continue
-        for slot in soup.select('#villageContent > .buildingSlot'):
+        for slot in _SEL_RESOURCE_SLOTS.select(soup):
+            try:
+                loc_id = int(_RE_BUILD_ID.search(slot['href']).group(1))
+                gid_str = next((m.group(1) for c in slot.get('class', []) if (m := _RE_GID_CLASS.match(c))), None)
+                if not gid_str: continue
+                gid = int(gid_str)
+                level = int(slot.find('div', class_='labelLayer').text.strip() or 0)
+                name = sys.intern(html_lib.unescape(_RE_HTML_TAG.sub('', slot.get('title', ''))).split('||')[0].strip())
+                found_buildings[loc_id] = {'id': loc_id, 'gid': gid, 'level': level, 'name': name}
+            except Exception: continue
+        for slot in _SEL_BUILDING_SLOTS.select(soup):
             try:
                 if not (slot.has_attr('data-aid') and slot.has_attr('data-gid')): continue
                 loc_id, gid = int(slot['data-aid']), int(slot.get('data-gid', 0))
-                level = int(slot.select_one('a.level[data-level]')['data-level']) if slot.select_one('a.level[data-level]') else 0
-                found_buildings[loc_id] = {'id': loc_id, 'gid': gid, 'level': level, 'name': slot.get('data-name')}
+                level_link = _SEL_BUILDING_LEVEL.select_one(slot)
+                level = int(level_link['data-level']) if level_link else 0
+                name = slot.get('data-name')
+                found_buildings[loc_id] = {'id': loc_id, 'gid': gid, 'level': level, 'name': sys.intern(name) if name else name}
             except Exception: continue
         out['buildings'] = list(found_buildings.values())
         
         # --- START OF FIX ---
-        for li in soup.select(".buildingList li"):
+        for li in _SEL_BUILD_QUEUE.select(soup):
             if (name_div := li.find("div", class_="name")) and (lvl_span := li.find("span", class_="lvl")) and (timer_span := li.find("span", class_="timer")):
                 # Extract only the number from the level text
                 level_text = lvl_span.text.strip()
-                level_match = re.search(r'\d+', level_text)
+                level_match = _RE_FIRST_INT.search(level_text)
                 level = int(level_match.group(0)) if level_match else 0
                 out["queue"].append({
                     "name": name_div.text.strip(),
@@ -399,11 +478,31 @@ class TravianClient:
                     "eta": int(timer_span.get("value", 0))
                 })
         # --- END OF FIX ---
-                
-        for v_entry in soup.select("#sidebarBoxVillageList .listEntry"):
-            if link := v_entry.find("a",href=re.compile(r"newdid=")):
-                out["villages"].append({"id":int(re.search(r"newdid=(\d+)",link["href"]).group(1)),"name":v_entry.find("span",class_="name").text.strip(),"active":"active" in v_entry.get("class",[])})
+
+        # One pass over the sidebar gives both the village list and the active village's coordinates
+        for v_entry in _SEL_VILLAGE_ENTRIES.select(soup):
+            is_active = "active" in v_entry.get("class", [])
+            if is_active and not out["coords"]:
+                try:
+                    if coord_span := v_entry.select_one(".coordinates"):
+                        x = coord_span.select_one(".coordinateX").text.strip('()')
+                        y = coord_span.select_one(".coordinateY").text.strip('()')
+                        out["coords"] = {'x': int(x), 'y': int(y)}
+                except Exception as exc: log.debug(f"Coordinate parser failed: {exc}")
+            if village := self._parse_village_entry(v_entry):
+                out["villages"].append(village)
         return out
+
+    @staticmethod
+    def _parse_village_entry(v_entry) -> Optional[Dict[str, Any]]:
+        if link := v_entry.find("a",href=_RE_NEWDID_HREF):
+            return {"id":int(_RE_NEWDID.search(link["href"]).group(1)),"name":v_entry.find("span",class_="name").text.strip(),"active":"active" in v_entry.get("class",[])}
+        return None
+
+    def parse_villages_sidebar(self, html: str) -> List[Dict[str, Any]]:
+        """Extracts only the village list, building the tree for the sidebar box alone."""
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer(id="sidebarBoxVillageList"))
+        return [v for v_entry in _SEL_VILLAGE_ENTRIES.select(soup) if (v := self._parse_village_entry(v_entry))]
     
     def get_hero_inventory(self) -> Dict[str, Any]:
         """
@@ -1065,7 +1164,31 @@ class TravianClient:
         except Exception as e:
             log.error(f"[{self.username}] An error occurred while fetching infobox HTML: {e}", exc_info=True)
             return None
-        
+
+# ─────────────────────────────────────────
+# SHARED CLIENTS (one-off dashboard requests)
+# ─────────────────────────────────────────
+_SHARED_CLIENTS: Dict[Tuple[str, str], TravianClient] = {}
+_shared_clients_lock = threading.Lock()
+
+def get_shared_client(account_info: Dict[str, Any]) -> Optional[TravianClient]:
+    """
+    Returns a logged-in client for the account, reusing its session across calls.
+    Agents keep their own clients, since Travian tracks the active village per session.
+    """
+    key = (account_info["username"], account_info["server_url"])
+    with _shared_clients_lock:
+        client = _SHARED_CLIENTS.get(key)
+        if client is None:
+            client = TravianClient(account_info["username"], account_info["password"],
+                                   account_info["server_url"], account_info.get("proxy"))
+            _SHARED_CLIENTS[key] = client
+    if not client.ensure_logged_in():
+        with _shared_clients_lock:
+            _SHARED_CLIENTS.pop(key, None)
+        return None
+    return client
+
 def send_resources(self, from_village_id: int, target_x: int, target_y: int, resources: Dict[str, int], runs: int = 1) -> bool:
     """
     Sends resources to another village using the marketplace via the REST API.
@@ -1149,8 +1272,7 @@ def get_all_villages(self) -> List[Dict[str, Any]]:
     """Fetches the complete list of villages from the sidebar."""
     try:
         resp = self.sess.get(f"{self.server_url}/dorf1.php", timeout=15)
-        parsed_data = self.parse_village_page(resp.text, "dorf1")
-        return parsed_data.get("villages", [])
+        return self.parse_villages_sidebar(resp.text)
     except Exception as e:
         log.error(f"[{self.username}] Failed to get all villages: {e}")
         return []
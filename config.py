@@ -1,9 +1,23 @@
 import os
 import re
 import json
+import tempfile
 import threading
 import logging
-from typing import List, Dict, Any
+from functools import lru_cache
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
 
 # ANSI escape codes for colors
 class bcolors:
@@ -29,6 +43,8 @@ class ColoredFormatter(logging.Formatter):
 # ─────────────────────────────────────────
 # LOGGING
 # ─────────────────────────────────────────
+_ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*m')
+
 class SocketIOHandler(logging.Handler):
     def __init__(self, socketio_instance):
         super().__init__()
@@ -37,8 +53,9 @@ class SocketIOHandler(logging.Handler):
     def emit(self, record):
         log_entry = self.format(record)
         # Remove ANSI color codes for the web dashboard
-        log_entry = re.sub(r'\x1b\[[0-9;]*m', '', log_entry)
-        self.socketio.emit('log_message', {'data': log_entry})
+        log_entry = _ANSI_ESCAPE_RE.sub('', log_entry)
+        # Send the level alongside so the dashboard does not have to regex it out of the text
+        self.socketio.emit('log_message', {'data': log_entry, 'level': record.levelname})
 
 def setup_logging(socketio_instance=None):
     """Sets up the global logger."""
@@ -59,6 +76,30 @@ def setup_logging(socketio_instance=None):
     return log
 
 log = setup_logging()
+
+# ─────────────────────────────────────────
+# SERIALIZATION
+# ─────────────────────────────────────────
+def json_loads(raw):
+    """Decodes JSON from str or bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def json_dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Encodes obj to UTF-8 JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+def json_dumps(obj: Any, indent: bool = False) -> str:
+    """Encodes obj to a JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        return json_dumps_bytes(obj, indent).decode("utf-8")
+    return json.dumps(obj, indent=2 if indent else None)
 # ─────────────────────────────────────────
 # SHARED STATE
 # ─────────────────────────────────────────
@@ -157,8 +198,74 @@ BOT_STATE: Dict[str, Any] = {
         ]
     }
 }
-# Use a re-entrant lock to prevent deadlocks
-state_lock = threading.RLock()
+class StateLock:
+    """
+    Guards BOT_STATE. `with state_lock:` takes the re-entrant write lock, as before;
+    `with state_lock.read():` is a shared section for code that only reads, so the
+    UI updater and config snapshots no longer queue behind each other.
+    Never take the write lock from inside a read section.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        self._reader_depth: Dict[int, int] = {}
+
+    def acquire(self) -> bool:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return True
+            self._writers_waiting += 1
+            while self._writer is not None or self._reader_depth:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer, self._writer_depth = me, 1
+        return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me or me in self._reader_depth:
+                # Already inside our own write or read section
+                self._reader_depth[me] = self._reader_depth.get(me, 0) + 1
+            else:
+                # Writers waiting get priority so a stream of readers cannot starve them
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._reader_depth[me] = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._reader_depth[me] -= 1
+                if not self._reader_depth[me]:
+                    del self._reader_depth[me]
+                    self._cond.notify_all()
+
+state_lock = StateLock()
+
+# Set whenever BOT_STATE changes; the UI updater coalesces these into one emit
+state_dirty = threading.Event()
+
+def mark_state_dirty() -> None:
+    state_dirty.set()
 
 # ─────────────────────────────────────────
 # CONFIG & DEFAULTS
@@ -192,8 +299,8 @@ def load_config() -> None:
         log.info(f"Please copy 'config.example.json' to '{config_path}' and fill in your account details.")
         return
     try:
-        with open(config_path, "r", encoding="utf-8") as fh:
-            data = json.load(fh)
+        with open(config_path, "rb") as fh:
+            data = json_loads(fh.read())
 
         config_updated = False
         accounts = data.get("accounts", [])
@@ -231,48 +338,111 @@ def load_config() -> None:
     except Exception as exc:
         log.warning(f"Could not read {config_path} → {exc}")
 
+SAVE_DEBOUNCE_SECONDS = 0.5
+_pending_save: Optional[threading.Timer] = None
+_pending_save_lock = threading.Lock()
+
+def _cancel_pending_save() -> bool:
+    global _pending_save
+    with _pending_save_lock:
+        timer, _pending_save = _pending_save, None
+    if timer is None:
+        return False
+    timer.cancel()
+    return True
+
+def schedule_save_config(delay: float = SAVE_DEBOUNCE_SECONDS) -> None:
+    """Coalesce a burst of UI edits into one write; every call restarts the window."""
+    global _pending_save
+    with _pending_save_lock:
+        if _pending_save is not None:
+            _pending_save.cancel()
+        _pending_save = threading.Timer(delay, save_config)
+        _pending_save.daemon = True
+        _pending_save.start()
+    mark_state_dirty()
+
+def flush_config() -> None:
+    """Write a debounced save now instead of waiting for its timer."""
+    if _cancel_pending_save():
+        save_config()
+
 def save_config() -> None:
-    with state_lock:
-        # Create a deep copy to avoid modifying the state during serialization
+    # A full write supersedes any debounced one still waiting
+    _cancel_pending_save()
+    with state_lock.read():
         payload = {
-            "accounts": [acc.copy() for acc in BOT_STATE["accounts"]],
-            "build_queues": BOT_STATE["build_queues"].copy(),
-            "demolish_queues": BOT_STATE["demolish_queues"].copy(),
-            "training_queues": BOT_STATE["training_queues"].copy(),
-            "smithy_upgrades": BOT_STATE["smithy_upgrades"].copy(),
-            "build_templates": BOT_STATE.get("build_templates", {}).copy()
+            "accounts": BOT_STATE["accounts"],
+            "build_queues": BOT_STATE["build_queues"],
+            "demolish_queues": BOT_STATE["demolish_queues"],
+            "training_queues": BOT_STATE["training_queues"],
+            "smithy_upgrades": BOT_STATE["smithy_upgrades"],
+            "build_templates": BOT_STATE.get("build_templates", {})
         }
-    with open("config.json", "w", encoding="utf‑8") as fh:
-        json.dump(payload, fh, indent=4)
-    log.info("Configuration saved ✔")
+        # Serializing under the lock is cheap with orjson and gives a consistent snapshot
+        raw = json_dumps_bytes(payload, indent=True)
+    # Write to a temp file and swap it in, so a crash never leaves a truncated config.json.
+    # orjson already produces UTF-8 bytes, so they go to the file without a decode/encode round trip.
+    fd, tmp_path = tempfile.mkstemp(prefix=".config.", suffix=".tmp", dir=".")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(raw)
+            fh.flush()
+            # Make sure the bytes are on disk before the rename makes them the live config
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, "config.json")
+    except OSError as exc:
+        log.error(f"Could not save config.json → {exc}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    else:
+        log.info("Configuration saved ✔")
+    mark_state_dirty()
 
 def parse_csharp_build_order(raw: str) -> List[Dict[str, Any]]:
     queue: List[Dict[str, Any]] = []
     if not raw.strip(): return queue
     try:
-        items = json.loads(raw)
+        items = json_loads(raw)
     except json.JSONDecodeError:
         log.error("Default build order JSON is malformed – returning empty queue ✖")
         return queue
     for node in items:
-        content = json.loads(node["Content"])
+        content = json_loads(node["Content"])
         if node["Type"] == 0:
             queue.append({"type": "building", "location": content["Location"], "level": content["Level"], "gid": content["Type"]})
         elif node["Type"] == 1:
             queue.append({"type": "resource", "plan": content.get("Plan", 0), "level": content["Level"]})
     return queue
 
+# Parsed once at import; callers get fresh dicts so they can mutate their copy.
+_DEFAULT_BUILD_QUEUE = tuple(parse_csharp_build_order(CSHARP_BUILD_ORDER))
+DEFAULT_BUILD_ORDER_FILE = "default_build_order.json"
+
+@lru_cache(maxsize=1)
+def _load_build_order_file(path: str, mtime: float) -> tuple:
+    """Parses the build order file; cached until its mtime changes."""
+    with open(path, "rb") as fh:
+        raw = fh.read().decode("utf-8")
+    return tuple(parse_csharp_build_order(raw))
+
 def load_default_build_queue() -> List[Dict[str, Any]]:
     try:
-        with open("default_build_order.json", "r", encoding="utf‑8") as fh:
-            raw = fh.read()
-        return parse_csharp_build_order(raw)
+        mtime = os.path.getmtime(DEFAULT_BUILD_ORDER_FILE)
+        items = _load_build_order_file(DEFAULT_BUILD_ORDER_FILE, mtime)
     except FileNotFoundError:
-        return parse_csharp_build_order(CSHARP_BUILD_ORDER)
+        items = _DEFAULT_BUILD_QUEUE
+    return [dict(x) for x in items]
 
+@lru_cache(maxsize=512)
 def gid_name(gid: int) -> str:
     return GID_MAPPING.get(int(gid), f"GID {gid}")
 
+# Buildings that may be built more than once per village
+_MULTI_INSTANCE_GIDS = frozenset({10, 11, 23, 36, 38, 39})
+
 def is_multi_instance(gid: int) -> bool:
     """Checks if a building can have multiple instances."""
-    return gid in [10, 11, 23, 36, 38, 39]
\ No newline at end of file
+    return gid in _MULTI_INSTANCE_GIDS
\ No newline at end of file
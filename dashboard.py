@@ -1,12 +1,12 @@
 # dashboard.py
 
-from flask import Flask, render_template_string
-from flask_socketio import SocketIO
-import copy
+from flask import Flask, Response
+from flask_socketio import SocketIO, emit
 import time
-from config import BOT_STATE, state_lock, save_config, log, setup_logging
+import threading
+from config import BOT_STATE, state_lock, schedule_save_config, log, setup_logging, json_dumps
 from bot import BotManager
-from client import TravianClient
+from client import get_shared_client
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import re
@@ -23,48 +23,78 @@ setup_logging(socketio)
 # The BotManager now runs continuously, managing agents based on their 'active' state.
 bot_manager_thread = None
 
-@app.route("/")
-def index_route():
+def _load_index_html():
+    """Reads the dashboard page once; it has no template markup, so it is served as-is."""
     try:
-        # Start the BotManager on the first request
-        global bot_manager_thread
-        if bot_manager_thread is None or not bot_manager_thread.is_alive():
-            log.info("Starting bot manager thread...")
-            bot_manager_thread = BotManager(socketio)
-            bot_manager_thread.start()
-
-        with open("index.html", "r", encoding="utf-8") as f:
-            return render_template_string(f.read())
+        with open("index.html", "rb") as f:
+            return f.read()
     except FileNotFoundError:
+        return None
+
+_INDEX_HTML = _load_index_html()
+
+# username -> account, rebuilt whenever BOT_STATE['accounts'] is replaced or changes size
+_account_index = {"list": None, "size": -1, "by_name": {}, "lower_names": frozenset()}
+
+def _account_lookup():
+    """Returns the current account index. Caller holds state_lock."""
+    accounts = BOT_STATE['accounts']
+    # Holds the list itself rather than its id(), which could be reused by a new list after the old one is freed
+    if _account_index["list"] is not accounts or _account_index["size"] != len(accounts):
+        _account_index.update(
+            list=accounts, size=len(accounts),
+            by_name={a['username']: a for a in accounts},
+            lower_names=frozenset(a['username'].lower() for a in accounts),
+        )
+    return _account_index
+
+def _find_account(username):
+    """Returns the account dict for username, or None. Caller holds state_lock."""
+    return _account_lookup()["by_name"].get(username)
+
+def _invalidate_account_index():
+    _account_index["list"] = None
+
+@app.route("/")
+def index_route():
+    # Start the BotManager on the first request
+    global bot_manager_thread
+    if bot_manager_thread is None or not bot_manager_thread.is_alive():
+        log.info("Starting bot manager thread...")
+        bot_manager_thread = BotManager(socketio)
+        bot_manager_thread.start()
+
+    if _INDEX_HTML is None:
         return "Error: index.html not found.", 404
+    return Response(_INDEX_HTML, mimetype="text/html")
 
 @socketio.on('connect')
 def on_connect():
     log.info("Dashboard connected.")
-    with state_lock:
-        socketio.emit("state_update", copy.deepcopy(BOT_STATE))
+    with state_lock.read():
+        payload = json_dumps(BOT_STATE)
+    # Full state goes only to the connecting client; everyone else keeps receiving deltas
+    emit("state_update", payload)
 
 @socketio.on('start_account')
 def handle_start_account(data):
     username = data.get('username')
     log.info(f"UI request to START account: {username}")
     with state_lock:
-        for acc in BOT_STATE['accounts']:
-            if acc['username'] == username:
-                acc['active'] = True
-                break
-    save_config()
+        acc = _find_account(username)
+        if acc:
+            acc['active'] = True
+    schedule_save_config()
 
 @socketio.on('stop_account')
 def handle_stop_account(data):
     username = data.get('username')
     log.info(f"UI request to STOP account: {username}")
     with state_lock:
-        for acc in BOT_STATE['accounts']:
-            if acc['username'] == username:
-                acc['active'] = False
-                break
-    save_config()
+        acc = _find_account(username)
+        if acc:
+            acc['active'] = False
+    schedule_save_config()
 
 @socketio.on('add_build_task')
 def handle_add_build_task(data):
@@ -79,10 +109,8 @@ def handle_add_build_task(data):
 
     log.info(f"UI request to ADD build task for village {village_id}: {task}")
     with state_lock:
-        if str(village_id) not in BOT_STATE['build_queues']:
-            BOT_STATE['build_queues'][str(village_id)] = []
-        BOT_STATE['build_queues'][str(village_id)].append(task)
-    save_config()
+        BOT_STATE['build_queues'].setdefault(str(village_id), []).append(task)
+    schedule_save_config()
 
     if bot_manager_thread and bot_manager_thread.is_alive():
         with state_lock:
@@ -111,7 +139,7 @@ def handle_add_account(data):
 
     with state_lock:
         # Make the check case-insensitive to avoid duplicates like "zero" and "Zero"
-        if any(a['username'].lower() == username.lower() for a in BOT_STATE['accounts']):
+        if username.lower() in _account_lookup()["lower_names"]:
             log.warning("Account %s already exists.", username)
             return
         
@@ -140,7 +168,7 @@ def handle_add_account(data):
         }
         
         BOT_STATE['accounts'].append(new_account)
-    save_config()
+    schedule_save_config()
 
 @socketio.on('update_account_setting')
 def handle_update_account_setting(data):
@@ -149,21 +177,22 @@ def handle_update_account_setting(data):
     value = data.get('value')
     log.info(f"Updating setting '{key}' for account {username} to {value}")
     with state_lock:
-        for acc in BOT_STATE['accounts']:
-            if acc['username'] == username:
-                if key.startswith('proxy_'):
-                    proxy_key = key.split('_', 1)[1]
-                    if 'proxy' not in acc:
-                        acc['proxy'] = {"ip": "", "port": "", "username": "", "password": ""}
-                    
-                    if proxy_key == 'ip': acc['proxy']['ip'] = value
-                    elif proxy_key == 'port': acc['proxy']['port'] = value
-                    elif proxy_key == 'user': acc['proxy']['username'] = value
-                    elif proxy_key == 'pass': acc['proxy']['password'] = value
-                else:
-                    acc[key] = value
-                break
-    save_config()
+        acc = _find_account(username)
+        if acc:
+            if key.startswith('proxy_'):
+                proxy_key = key.split('_', 1)[1]
+                if 'proxy' not in acc:
+                    acc['proxy'] = {"ip": "", "port": "", "username": "", "password": ""}
+
+                if proxy_key == 'ip': acc['proxy']['ip'] = value
+                elif proxy_key == 'port': acc['proxy']['port'] = value
+                elif proxy_key == 'user': acc['proxy']['username'] = value
+                elif proxy_key == 'pass': acc['proxy']['password'] = value
+            else:
+                acc[key] = value
+                if key == 'username':
+                    _invalidate_account_index()
+    schedule_save_config()
 
 @socketio.on('remove_account')
 def handle_remove_account(data):
@@ -171,7 +200,7 @@ def handle_remove_account(data):
     log.info("Removing account: %s", username_to_remove)
     with state_lock:
         BOT_STATE['accounts'] = [acc for acc in BOT_STATE['accounts'] if acc['username'] != username_to_remove]
-    save_config()
+    schedule_save_config()
     
 @socketio.on('update_build_queue')
 def handle_update_build_queue(data):
@@ -181,7 +210,7 @@ def handle_update_build_queue(data):
         log.info("Updating build queue for village %s", village_id)
         with state_lock:
             BOT_STATE['build_queues'][str(village_id)] = queue
-        save_config()
+        schedule_save_config()
 
 @socketio.on('move_build_queue_item')
 def handle_move_build_queue_item(data):
@@ -194,20 +223,20 @@ def handle_move_build_queue_item(data):
         if not (0 <= index < len(queue)):
             return
 
-        item = queue.pop(index)
-
-        if direction == 'top':
-            queue.insert(0, item)
+        # Adjacent moves are a swap; top/bottom only rewrite the slice the item passes over
+        if direction == 'up' and index > 0:
+            queue[index - 1], queue[index] = queue[index], queue[index - 1]
+        elif direction == 'down' and index < len(queue) - 1:
+            queue[index], queue[index + 1] = queue[index + 1], queue[index]
+        elif direction == 'top':
+            queue[:index + 1] = [queue[index]] + queue[:index]
         elif direction == 'bottom':
-            queue.append(item)
-        elif direction == 'up':
-            queue.insert(max(0, index - 1), item)
-        elif direction == 'down':
-            queue.insert(min(len(queue), index + 1), item)
+            queue[index:] = queue[index + 1:] + [queue[index]]
 
         BOT_STATE['build_queues'][village_id] = queue
-    
-    save_config()
+
+    # Reordering is usually a burst of clicks; write once when it settles
+    schedule_save_config()
 
 @socketio.on('update_hero_settings')
 def handle_update_hero_settings(data):
@@ -215,23 +244,19 @@ def handle_update_hero_settings(data):
     settings = data.get('settings')
     log.info(f"Updating hero settings for account {username}")
     with state_lock:
-        for acc in BOT_STATE['accounts']:
-            if acc['username'] == username:
-                if 'hero_settings' not in acc:
-                    acc['hero_settings'] = {}
-                acc['hero_settings'].update(settings)
-                break
-    save_config()
+        acc = _find_account(username)
+        if acc:
+            acc.setdefault('hero_settings', {}).update(settings)
+    schedule_save_config()
 
 @socketio.on('save_build_template')
 def handle_save_build_template(data):
     template_name = data.get('templateName')
     village_id = data.get('villageId')
     with state_lock:
-        if 'build_templates' not in BOT_STATE:
-            BOT_STATE['build_templates'] = {}
-        BOT_STATE['build_templates'][template_name] = BOT_STATE['build_queues'].get(str(village_id), [])
-    save_config()
+        # Tasks are flat dicts, so per-task copies keep the template detached from the live queue
+        BOT_STATE.setdefault('build_templates', {})[template_name] = [dict(task) for task in BOT_STATE['build_queues'].get(str(village_id), [])]
+    schedule_save_config()
 
 @socketio.on('load_build_template')
 def handle_load_build_template(data):
@@ -239,8 +264,8 @@ def handle_load_build_template(data):
     village_id = data.get('villageId')
     with state_lock:
         if 'build_templates' in BOT_STATE and template_name in BOT_STATE['build_templates']:
-            BOT_STATE['build_queues'][str(village_id)] = BOT_STATE['build_templates'][template_name]
-    save_config()
+            BOT_STATE['build_queues'][str(village_id)] = [dict(task) for task in BOT_STATE['build_templates'][template_name]]
+    schedule_save_config()
 
 @socketio.on('delete_build_template')
 def handle_delete_build_template(data):
@@ -248,7 +273,7 @@ def handle_delete_build_template(data):
     with state_lock:
         if 'build_templates' in BOT_STATE and template_name in BOT_STATE['build_templates']:
             del BOT_STATE['build_templates'][template_name]
-    save_config()
+    schedule_save_config()
 
 @socketio.on('update_training_queues')
 def handle_update_training_queues(data):
@@ -257,12 +282,8 @@ def handle_update_training_queues(data):
     if village_id and settings is not None:
         log.info(f"Updating training queue for village {village_id}")
         with state_lock:
-            if 'training_queues' not in BOT_STATE:
-                BOT_STATE['training_queues'] = {}
-            if str(village_id) not in BOT_STATE['training_queues']:
-                BOT_STATE['training_queues'][str(village_id)] = {}
-            BOT_STATE['training_queues'][str(village_id)].update(settings)
-        save_config()
+            BOT_STATE.setdefault('training_queues', {}).setdefault(str(village_id), {}).update(settings)
+        schedule_save_config()
 
 @socketio.on('update_demolish_queue')
 def handle_update_demolish_queue(data):
@@ -271,10 +292,8 @@ def handle_update_demolish_queue(data):
     if village_id and queue is not None:
         log.info(f"Updating demolish queue for village {village_id}")
         with state_lock:
-            if 'demolish_queues' not in BOT_STATE:
-                BOT_STATE['demolish_queues'] = {}
-            BOT_STATE['demolish_queues'][str(village_id)] = queue
-        save_config()
+            BOT_STATE.setdefault('demolish_queues', {})[str(village_id)] = queue
+        schedule_save_config()
 
 @socketio.on('update_smithy_upgrades')
 def handle_update_smithy_upgrades(data):
@@ -283,12 +302,8 @@ def handle_update_smithy_upgrades(data):
     if village_id and settings is not None:
         log.info(f"Updating smithy upgrades for village {village_id}")
         with state_lock:
-            if 'smithy_upgrades' not in BOT_STATE:
-                BOT_STATE['smithy_upgrades'] = {}
-            if str(village_id) not in BOT_STATE['smithy_upgrades']:
-                BOT_STATE['smithy_upgrades'][str(village_id)] = {}
-            BOT_STATE['smithy_upgrades'][str(village_id)].update(settings)
-        save_config()
+            BOT_STATE.setdefault('smithy_upgrades', {}).setdefault(str(village_id), {}).update(settings)
+        schedule_save_config()
         
 @socketio.on('copy_settings')
 def handle_copy_settings(data):
@@ -334,14 +349,16 @@ def handle_copy_settings(data):
             log.info(f"Applying {setting_type} settings to village ID {target_id}")
 
             if setting_type == 'training':
-                new_target_settings = copy.deepcopy(source_settings)
+                # Settings are flat apart from 'buildings', so copy just the levels that get written to
+                new_target_settings = {k: v for k, v in source_settings.items() if k != 'buildings'}
                 new_target_settings['buildings'] = {}
+                target_gids = {b.get('gid') for b in target_village_details.get('buildings', [])}
 
                 for building_key, building_setting in source_settings.get('buildings', {}).items():
                     source_gid = building_setting.get('gid')
                     
-                    if any(b.get('gid') == source_gid for b in target_village_details.get('buildings', [])):
-                        new_target_settings['buildings'][building_key] = building_setting
+                    if source_gid in target_gids:
+                        new_target_settings['buildings'][building_key] = dict(building_setting)
                         log.info(f"  - Copied setting for {building_key} (GID: {source_gid})")
                     else:
                         log.info(f"  - Skipped {building_key} (GID: {source_gid}) - building not found in target village.")
@@ -351,13 +368,13 @@ def handle_copy_settings(data):
             elif setting_type == 'smithy':
                 # For smithy, we just check if the building exists and copy everything.
                 if any(b.get('gid') == 13 for b in target_village_details.get('buildings', [])):
-                     BOT_STATE.setdefault(source_key, {})[target_id] = copy.deepcopy(source_settings)
+                     BOT_STATE.setdefault(source_key, {})[target_id] = {**source_settings, 'priority': list(source_settings.get('priority', []))}
                      log.info(f"  - Copied smithy settings.")
                 else:
                     log.info(f"  - Skipped smithy settings - building not found in target village.")
 
 
-    save_config()
+    schedule_save_config()
     log.info(f"Finished copying {setting_type} settings.")
 
 @socketio.on('set_lowest_training_time')
@@ -366,7 +383,7 @@ def handle_set_lowest_training_time(data):
     log.info(f"UI request to set lowest training time for village {village_id}")
 
     # Find the relevant account info to create a temporary client
-    with state_lock:
+    with state_lock.read():
         account_info = None
         for acc in BOT_STATE.get("accounts", []):
             villages = BOT_STATE.get("village_data", {}).get(acc['username'], [])
@@ -378,19 +395,14 @@ def handle_set_lowest_training_time(data):
         log.error(f"Could not find account for village {village_id}")
         return
 
-    client = TravianClient(
-        account_info['username'],
-        account_info['password'],
-        account_info['server_url'],
-        account_info.get('proxy')
-    )
-    if not client.login():
+    client = get_shared_client(account_info)
+    if not client:
         log.error(f"Failed to log in for {account_info['username']}")
         return
 
     lowest_queue_duration_seconds = float('inf')
     
-    with state_lock:
+    with state_lock.read():
         village_config = BOT_STATE.get('training_queues', {}).get(str(village_id), {})
         buildings = village_config.get('buildings', {})
 
@@ -407,7 +419,7 @@ def handle_set_lowest_training_time(data):
         log.info(f"Lowest queue duration found: {lowest_queue_duration_seconds:.2f}s. Setting min queue to {lowest_time_minutes} minutes.")
         with state_lock:
             BOT_STATE['training_queues'][str(village_id)]['min_queue_duration_minutes'] = lowest_time_minutes
-        save_config()
+        schedule_save_config()
 
 
 @socketio.on('set_end_time_from_infobox')
@@ -416,7 +428,7 @@ def handle_set_end_time_from_infobox(data):
     time_type = data.get('timeType') # 'ww' or 'artefacts'
     log.info(f"UI request to set end time from infobox ({time_type}) for village {village_id}")
 
-    with state_lock:
+    with state_lock.read():
         account_info = None
         for acc in BOT_STATE.get("accounts", []):
             villages = BOT_STATE.get("village_data", {}).get(acc['username'], [])
@@ -428,13 +440,8 @@ def handle_set_end_time_from_infobox(data):
         log.error(f"Could not find account for village {village_id}")
         return
 
-    client = TravianClient(
-        account_info['username'],
-        account_info['password'],
-        account_info['server_url'],
-        account_info.get('proxy')
-    )
-    if not client.login():
+    client = get_shared_client(account_info)
+    if not client:
         log.error(f"Failed to log in for {account_info['username']}")
         return
         
@@ -464,7 +471,7 @@ def handle_set_end_time_from_infobox(data):
             
             with state_lock:
                 BOT_STATE['training_queues'][str(village_id)]['max_training_time'] = formatted_end_time
-            save_config()
+            schedule_save_config()
         except (ValueError, TypeError):
             log.error("Could not parse timer value from infobox.")
     else:
@@ -476,7 +483,24 @@ def handle_fetch_proxies():
     Handles the request to fetch and test proxies.
     """
     log.info("UI request to fetch and test proxies.")
-    fastest_proxies = get_fastest_proxies()
+    # Repeated clicks while a check is running share its broadcast result instead of starting another
+    if not _proxy_fetch_lock.acquire(blocking=False):
+        log.info("Proxy check already in progress; its results will be sent to all clients.")
+        return
+    # Testing takes up to the proxy timeout; run it in the background so the handler returns at once
+    socketio.start_background_task(_fetch_proxies_task)
+
+_proxy_fetch_lock = threading.Lock()
+
+def _fetch_proxies_task():
+    try:
+        fastest_proxies = get_fastest_proxies()
+    except Exception as e:
+        # Still answer, or the dashboard would wait for results forever
+        log.error(f"Proxy check failed: {e}", exc_info=True)
+        fastest_proxies = []
+    finally:
+        _proxy_fetch_lock.release()
     socketio.emit("proxy_results", {"proxies": fastest_proxies})
 
 @socketio.on('update_loop_settings')
@@ -486,12 +510,8 @@ def handle_update_loop_settings(data):
     if village_id and settings:
         log.info(f"UI request to update loop settings for village {village_id}")
         with state_lock:
-            if "loop_module_state" not in BOT_STATE:
-                BOT_STATE["loop_module_state"] = {}
-            if str(village_id) not in BOT_STATE["loop_module_state"]:
-                 BOT_STATE["loop_module_state"][str(village_id)] = {} # Initialize if needed
-            BOT_STATE["loop_module_state"][str(village_id)].update(settings)
-        save_config()
+            BOT_STATE.setdefault("loop_module_state", {}).setdefault(str(village_id), {}).update(settings)
+        schedule_save_config()
 
 @socketio.on('start_special_agent')
 def handle_start_special_agent(data):
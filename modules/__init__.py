@@ -5,26 +5,35 @@ import importlib
 
 __all__ = ["load_modules"]
 
-def load_modules(agent):
-    """Dynamically load all module classes in this package and instantiate them."""
-    modules = []
-    base_dir = os.path.dirname(__file__)
-    # Exclude independent agents (threads) and base classes from this list.
-    modules_to_exclude = [
-        '__init__.py', 
-        'base.py', 
-        'adventure.py', 
-        'hero.py', 
-        'training.py', 
-        'demolish.py',
-        'smithyupgrades.py'
-    ]
+# Exclude independent agents (threads) and base classes from this list.
+_MODULES_TO_EXCLUDE = frozenset({
+    '__init__.py',
+    'base.py',
+    'adventure.py',
+    'hero.py',
+    'training.py',
+    'demolish.py',
+    'smithyupgrades.py'
+})
+
+# Module classes found on first use; every agent after that reuses the list.
+_MODULE_CLASSES = None
 
+def _discover():
+    global _MODULE_CLASSES
+    classes = []
+    base_dir = os.path.dirname(__file__)
     for fname in sorted(os.listdir(base_dir)):
-        if fname.endswith('.py') and fname not in modules_to_exclude:
+        if fname.endswith('.py') and fname not in _MODULES_TO_EXCLUDE:
             mod_name = fname[:-3]
             mod = importlib.import_module(f'.{mod_name}', package=__name__)
             cls = getattr(mod, 'Module', None)
             if cls:
-                modules.append(cls(agent))
-    return modules
\ No newline at end of file
+                classes.append(cls)
+    _MODULE_CLASSES = classes
+
+def load_modules(agent):
+    """Instantiate every module class in this package for the given agent."""
+    if _MODULE_CLASSES is None:
+        _discover()
+    return [cls(agent) for cls in _MODULE_CLASSES]
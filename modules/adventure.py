@@ -1,12 +1,16 @@
 import re
 import time
 import json
+import hashlib
 from datetime import timedelta
 
 from bs4 import BeautifulSoup
 
 from .base import BaseModule
-from config import log
+from config import log, HTML_PARSER
+
+_ADVENTURE_SCRIPT_RE = re.compile(r"window\.Travian\.React\.HeroAdventure\.render")
+_JSON_DECODER = json.JSONDecoder()
 
 class Module(BaseModule):
     """
@@ -16,6 +20,29 @@ class Module(BaseModule):
     def __init__(self, agent):
         super().__init__(agent)
         self.next_check_time = {}
+        # username -> (etag, body digest, (hero_home, adventure_count)) of the last dorf1 parse
+        self._dorf1_cache = {}
+
+    def _check_dorf1(self, client):
+        """Returns (hero_home, adventure_count); an unchanged dorf1 reuses the previous parse."""
+        cached = self._dorf1_cache.get(client.username)
+        headers = {"If-None-Match": cached[0]} if cached and cached[0] else {}
+        dorf1_resp = client.sess.get(f"{client.server_url}/dorf1.php", timeout=15, headers=headers)
+        if dorf1_resp.status_code == 304 and cached:
+            return cached[2]
+        digest = hashlib.blake2b(dorf1_resp.content, digest_size=16).digest()
+        if cached and cached[1] == digest:
+            return cached[2]
+
+        soup = BeautifulSoup(dorf1_resp.text, HTML_PARSER)
+        hero_home = soup.select_one('.heroStatus i.heroHome') is not None
+        adventure_count = 0
+        if hero_home:
+            adventure_button = soup.select_one('a.adventure.attention .content')
+            adventure_count = int(adventure_button.text.strip()) if adventure_button else 0
+        result = (hero_home, adventure_count)
+        self._dorf1_cache[client.username] = (dorf1_resp.headers.get("ETag"), digest, result)
+        return result
 
     def tick(self, client):
         """
@@ -29,17 +56,15 @@ class Module(BaseModule):
             return
 
         try:
-            dorf1_resp = client.sess.get(f"{client.server_url}/dorf1.php", timeout=15)
-            soup = BeautifulSoup(dorf1_resp.text, 'html.parser')
+            hero_home, adventure_count = self._check_dorf1(client)
 
-            if not soup.select_one('.heroStatus i.heroHome'):
+            if not hero_home:
                 # Hero is not home. We can't get the exact return time from this page,
                 # so we'll just check back in a minute.
                 self.next_check_time[username] = time.time() + 60
                 return
 
-            adventure_button = soup.select_one('a.adventure.attention .content')
-            if not adventure_button or int(adventure_button.text.strip()) == 0:
+            if adventure_count == 0:
                 # No adventures available. Check again in 15 minutes.
                 self.next_check_time[username] = time.time() + 900
                 return
@@ -53,9 +78,9 @@ class Module(BaseModule):
 
         try:
             adv_page_resp = client.sess.get(f"{client.server_url}/hero.php?t=3", timeout=15)
-            adv_soup = BeautifulSoup(adv_page_resp.text, 'html.parser')
+            adv_soup = BeautifulSoup(adv_page_resp.text, HTML_PARSER)
             
-            script_tag = adv_soup.find("script", string=re.compile(r"window\.Travian\.React\.HeroAdventure\.render"))
+            script_tag = adv_soup.find("script", string=_ADVENTURE_SCRIPT_RE)
             if not script_tag:
                 log.warning(f"[{username}] Could not find the adventure data script on the page.")
                 self.next_check_time[username] = time.time() + 300
@@ -75,25 +100,14 @@ class Module(BaseModule):
                 self.next_check_time[username] = time.time() + 300
                 return
             
-            # Find the matching closing brace
-            open_braces = 0
-            json_end = -1
-            for i, char in enumerate(script_content[json_start:]):
-                if char == '{':
-                    open_braces += 1
-                elif char == '}':
-                    open_braces -= 1
-                    if open_braces == 0:
-                        json_end = json_start + i + 1
-                        break
-            
-            if json_end == -1:
-                log.warning(f"[{username}] Could not find matching closing brace for viewData JSON.")
+            # Decode the object in place; the C scanner stops at its closing brace
+            try:
+                adventure_data, _ = _JSON_DECODER.raw_decode(script_content, json_start)
+            except json.JSONDecodeError:
+                log.warning(f"[{username}] Could not decode viewData JSON.")
                 self.next_check_time[username] = time.time() + 300
                 return
 
-            json_str = script_content[json_start:json_end]
-            adventure_data = json.loads(json_str)
             adventures_list = adventure_data.get("data", {}).get("ownPlayer", {}).get("hero", {}).get("adventures", [])
 
             if not adventures_list:
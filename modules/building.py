@@ -1,76 +1,132 @@
 # modules/building.py
 
 from .base import BaseModule
-from config import BOT_STATE, state_lock, save_config, gid_name, log, is_multi_instance
+from config import BOT_STATE, state_lock, schedule_save_config, gid_name, log, is_multi_instance
 import json
 import time
 from collections import deque
 import random
 import re
 
-class Module(BaseModule):
-    """Handles building queue management for a village."""
+# Server queue entries read "<Building> Level <n>"; stripping the suffix leaves the building name
+_LEVEL_SUFFIX_RE = re.compile(r'\s+Level\s+\d+\s*$')
 
-    def __init__(self, agent):
-        super().__init__(agent)
+# Buildings that may only stand on one particular slot (rally point, walls)
+_FIXED_LOCATIONS = {16: 39, 31: 40, 32: 40, 33: 40, 42: 40, 43: 40}
+# Slots kept for those buildings, never handed out as a random empty slot
+_RESERVED_SLOT_IDS = frozenset({39, 40})
+# How long an unchanged queue head keeps its previous "wait" decision
+_WAIT_RECHECK_SECONDS = 30
+
+# Parsed once and shared by every village's Module: int gid -> ((prereq_gid, prereq_level), ...)
+_PREREQS_CACHE = None
+
+def _load_prereqs():
+    global _PREREQS_CACHE
+    if _PREREQS_CACHE is None:
         try:
             with open("prerequisites.json", "r") as f:
-                self.prerequisites_data = json.load(f)
+                raw = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError) as e:
+            # Cached as well, so the other village modules don't re-read the file and repeat the error
             log.error(f"Could not load or parse prerequisites.json: {e}. Dependency checks will be skipped.")
-            self.prerequisites_data = {}
+            _PREREQS_CACHE = {}
+            return _PREREQS_CACHE
+        _PREREQS_CACHE = {
+            int(gid): tuple((p['gid'], p['level']) for p in entry.get("prerequisites", []))
+            for gid, entry in raw.items()
+        }
+    return _PREREQS_CACHE
+
+class Module(BaseModule):
+    """Handles building queue management for a village."""
+
+    def __init__(self, agent):
+        super().__init__(agent)
+        self._prereqs = _load_prereqs()
+        # (head signature, monotonic deadline) of the last tick that decided to wait
+        self._wait_cache = None
 
     def get_prerequisites(self, gid):
-        """Gets the single list of prerequisites for constructing a building."""
-        return self.prerequisites_data.get(str(gid), {}).get("prerequisites", [])
+        """Gets the (gid, level) pairs required before constructing a building."""
+        return self._prereqs.get(gid, ())
 
-    def _resolve_dependencies(self, goal_gid, all_buildings):
+    def _resolve_dependencies(self, goal_gid, buildings_by_gid):
         """
         Checks if the initial construction prerequisites for a goal are met.
         If not, returns a list of tasks for the missing prerequisites.
         """
         tasks_to_add = []
-        prereqs = self.get_prerequisites(goal_gid)
 
-        for prereq in prereqs:
-            prereq_gid = prereq['gid']
-            prereq_level = prereq['level']
-            
-            existing_building = next((b for b in all_buildings if b.get('gid') == prereq_gid), None)
-            
-            if existing_building:
+        for prereq_gid, prereq_level in self._prereqs.get(goal_gid, ()):
+            existing = buildings_by_gid.get(prereq_gid)
+            if existing:
+                existing_building = existing[0]
                 actual_level = existing_building.get('level', 0)
                 if actual_level < prereq_level:
                     log.info(f"Dependency for {gid_name(goal_gid)} not met: {gid_name(prereq_gid)} needs Lvl {prereq_level}, is at {actual_level}.")
-                    tasks_to_add.append({
-                        'type': 'building',
-                        'location': existing_building['id'],
-                        'gid': prereq_gid,
-                        'level': prereq_level
-                    })
+                    tasks_to_add.append({'type': 'building', 'location': existing_building['id'], 'gid': prereq_gid, 'level': prereq_level})
             else:
                 log.info(f"Dependency for {gid_name(goal_gid)} not met: {gid_name(prereq_gid)} needs to be built.")
-                tasks_to_add.append({
-                    'type': 'building',
-                    'gid': prereq_gid,
-                    'level': prereq_level
-                })
-        
+                tasks_to_add.append({'type': 'building', 'gid': prereq_gid, 'level': prereq_level})
+
         return tasks_to_add
 
+    def _head_is(self, goal_task):
+        """True if goal_task is still the head of the live queue. Caller holds state_lock."""
+        queue = BOT_STATE["build_queues"].get(self.agent.village_key)
+        return bool(queue) and queue[0] is goal_task
+
+    def _drop_head(self, goal_task):
+        """Removes the finished or invalid task at the head of the live queue."""
+        with state_lock:
+            # Another writer (the UI) replaced the head since this tick read it; the next tick sees the new one
+            if not self._head_is(goal_task):
+                return 0
+            del BOT_STATE["build_queues"][self.agent.village_key][0]
+        schedule_save_config()
+        return 'queue_modified'
+
+    def _prepend(self, goal_task, tasks):
+        """Inserts tasks in front of the head of the live queue."""
+        with state_lock:
+            if not self._head_is(goal_task):
+                return 0
+            BOT_STATE["build_queues"][self.agent.village_key][0:0] = tasks
+        schedule_save_config()
+        return 'queue_modified'
+
+    def _set_head_location(self, goal_task, location):
+        """Pins the location of the task at the head of the live queue."""
+        with state_lock:
+            if not self._head_is(goal_task):
+                return 0
+            goal_task['location'] = location
+        schedule_save_config()
+        return 'queue_modified'
+
     def tick(self, village_data):
         agent = self.agent
-        
-        with state_lock:
-            build_queue = BOT_STATE["build_queues"].get(str(agent.village_id), [])[:]
 
-        if not build_queue:
+        # Only the head is needed to decide; edits go straight to the live list instead of a copy.
+        # A shared read section, so village agents peeking at their own queue don't serialize on each other.
+        with state_lock.read():
+            live_queue = BOT_STATE["build_queues"].get(agent.village_key)
+            goal_task = live_queue[0] if live_queue else None
+
+        if goal_task is None:
             return 0
 
         all_buildings = village_data.get("buildings", [])
         active_builds = village_data.get("queue", [])
-        goal_task = build_queue[0]
         action_plan = None
+
+        # Same head task and same server queue length as a recent "wait" result: nothing can have changed
+        head_sig = (id(goal_task), goal_task.get('type'), goal_task.get('gid'), goal_task.get('level'),
+                    goal_task.get('location'), len(active_builds))
+        if self._wait_cache and self._wait_cache[0] == head_sig and time.monotonic() < self._wait_cache[1]:
+            return 0
+        self._wait_cache = None
         
         if goal_task.get('type') == 'resource_plan':
             target_level = goal_task.get('level')
@@ -79,35 +135,30 @@ class Module(BaseModule):
 
             # Extract the names of buildings currently in the server-side construction queue.
             # This makes the bot aware of what it has already told the server to do.
-            queued_building_names = [re.sub(r'\sLevel\s\d+', '', build['name']).strip() for build in active_builds]
+            queued_building_names = frozenset(_LEVEL_SUFFIX_RE.sub('', build['name']).strip() for build in active_builds)
 
-            resource_fields = sorted(
-                [b for b in all_buildings if 1 <= b['id'] <= 18], 
-                key=lambda x: (x.get('level', 0), x['id'])
-            )
-            
-            # Filter out fields that are already being upgraded to avoid re-queueing them.
-            available_fields_to_upgrade = [
-                field for field in resource_fields 
-                if gid_name(field.get('gid')) not in queued_building_names
-            ]
+            resource_fields = [b for b in all_buildings if 1 <= b['id'] <= 18]
 
-            # Find the first available field that is below the target level.
-            field_to_upgrade = next((field for field in available_fields_to_upgrade if field.get('level', 0) < target_level), None)
+            # Lowest (level, id) field below the target that isn't already being upgraded;
+            # a single min() pass instead of sorting every field.
+            field_to_upgrade = min(
+                (field for field in resource_fields
+                 if field.get('level', 0) < target_level and gid_name(field.get('gid')) not in queued_building_names),
+                key=lambda x: (x.get('level', 0), x['id']),
+                default=None
+            )
 
             if not field_to_upgrade:
                 # If no field is available to upgrade, check if the plan is actually finished.
                 all_fields_at_target = all(f.get('level', 0) >= target_level for f in resource_fields)
                 if all_fields_at_target:
                     log.info(f"AGENT({agent.village_name}): Resource plan to level {target_level} is complete. Removing task.")
-                    with state_lock:
-                        BOT_STATE["build_queues"][str(agent.village_id)] = build_queue[1:]
-                    save_config()
-                    return 'queue_modified'
+                    return self._drop_head(goal_task)
                 else:
                     # If not finished, but no fields are available, it means they are all in the server queue.
                     # The bot should wait patiently for a slot to open.
                     log.info(f"AGENT({agent.village_name}): All available resource fields for the plan are already in the build queue. Waiting for an open slot.")
+                    self._wait_cache = (head_sig, time.monotonic() + _WAIT_RECHECK_SECONDS)
                     return 0 # Return 0 to signify no action was taken, causing the agent to wait.
 
             action_plan = {'type': 'upgrade', 'location': field_to_upgrade['id'], 'gid': field_to_upgrade['gid'], 'is_new': False}
@@ -118,93 +169,103 @@ class Module(BaseModule):
             goal_level = goal_task.get('level')
             goal_location = goal_task.get('location')
 
+            # Indexed once per tick so each lookup below is a dict hit instead of a scan
+            buildings_by_id = {}
+            buildings_by_gid = {}
+            for b in all_buildings:
+                buildings_by_id[b.get('id')] = b
+                buildings_by_gid.setdefault(b.get('gid'), []).append(b)
+
+            # Fast path: a pinned task whose slot already reached the goal needs no further placement or queue scan
+            if goal_location is not None:
+                target = buildings_by_id.get(goal_location)
+                if target is not None and target.get('gid', 0) != 0 and target.get('level', 0) >= goal_level:
+                    log.info(f"AGENT({agent.village_name}): Task '{gid_name(goal_gid)}' Lvl {goal_level} at Loc {goal_location} is already complete (Lvl: {target.get('level', 0)}). Removing from queue.")
+                    return self._drop_head(goal_task)
+
             # --- FINAL FIX ---
             if goal_location is None:
                 log.info(f"AGENT({agent.village_name}): Task for {gid_name(goal_gid)} has no location. Finding best placement...")
                 
-                # Check for any existing building of this type that can be upgraded.
-                existing_buildings_of_type = [b for b in all_buildings if b.get('gid') == goal_gid and b.get('level', 0) < goal_level]
+                # Lowest-level existing building of this type that can still be upgraded, in one pass over its bucket.
+                building_to_upgrade = None
+                lowest_level = goal_level
+                for b in buildings_by_gid.get(goal_gid, ()):
+                    level = b.get('level', 0)
+                    if level < lowest_level:
+                        building_to_upgrade, lowest_level = b, level
                 
-                if existing_buildings_of_type:
-                    # Prioritize upgrading the one with the lowest level.
-                    building_to_upgrade = min(existing_buildings_of_type, key=lambda b: b.get('level', 0))
+                if building_to_upgrade:
                     goal_location = building_to_upgrade['id']
                     log.info(f"AGENT({agent.village_name}): Found existing {gid_name(goal_gid)} at location {goal_location} to upgrade.")
                 else:
                     # Only if no existing building can be upgraded, find a new slot.
                     log.info(f"AGENT({agent.village_name}): No upgradable {gid_name(goal_gid)} found. Finding a new location.")
-                    FIXED_LOCATIONS = {16: 39, 31: 40, 32: 40, 33: 40, 42: 40, 43: 40}
-
-                    if goal_gid in FIXED_LOCATIONS:
-                        goal_location = FIXED_LOCATIONS[goal_gid]
+                    if goal_gid in _FIXED_LOCATIONS:
+                        goal_location = _FIXED_LOCATIONS[goal_gid]
                         log.info(f"AGENT({agent.village_name}): Assigning {gid_name(goal_gid)} to its fixed location: {goal_location}")
                     else:
-                        empty_slots = [b for b in all_buildings if b.get('id') > 18 and b.get('id') not in [39, 40] and b.get('gid') == 0]
-                        if not empty_slots:
+                        # Reservoir sampling: a uniformly random empty slot in one pass, without building a list
+                        chosen_slot = None
+                        empty_count = 0
+                        for b in all_buildings:
+                            slot_id = b.get('id', 0)
+                            if slot_id > 18 and slot_id not in _RESERVED_SLOT_IDS and b.get('gid') == 0:
+                                empty_count += 1
+                                if random.random() * empty_count < 1.0:
+                                    chosen_slot = b
+                        if chosen_slot is None:
                             log.error(f"AGENT({agent.village_name}): No empty slots available to build {gid_name(goal_gid)}. Removing task.")
-                            with state_lock:
-                                BOT_STATE["build_queues"][str(agent.village_id)] = build_queue[1:]
-                            save_config()
-                            return 'queue_modified'
-                        
-                        chosen_slot = random.choice(empty_slots)
+                            return self._drop_head(goal_task)
+
                         goal_location = chosen_slot['id']
                         log.info(f"AGENT({agent.village_name}): Assigning {gid_name(goal_gid)} to random empty slot: {goal_location}")
             
                 # Update the task with the determined location and re-evaluate
-                with state_lock:
-                    BOT_STATE["build_queues"][str(agent.village_id)][0]['location'] = goal_location
-                save_config()
-                return 'queue_modified'
+                return self._set_head_location(goal_task, goal_location)
 
-            target_building_on_map = next((b for b in all_buildings if b.get('id') == goal_location), None)
-            
-            if not target_building_on_map:
+            target_building_on_map = buildings_by_id.get(goal_location)
+            if target_building_on_map is None:
                 log.error(f"AGENT({agent.village_name}): Building at location {goal_location} not found in village data. This should not happen.")
                 return 0
 
-            current_level = target_building_on_map.get('level', 0)
-            is_new_build = target_building_on_map.get('gid', 0) == 0
+            gid_slot, current_level = target_building_on_map.get('gid', 0), target_building_on_map.get('level', 0)
+            is_new_build = gid_slot == 0
 
+            # Highest level this building reaches once the server queue finishes; stop as soon as the goal is covered
             building_name_in_queue = gid_name(goal_gid)
-            queued_levels = [int(build.get('level')) for build in active_builds if building_name_in_queue in build.get('name')]
-            effective_level = max([current_level] + queued_levels)
+            effective_level = current_level
+            for build in active_builds:
+                if building_name_in_queue in build.get('name', ''):
+                    queued_level = int(build.get('level', 0))
+                    if queued_level > effective_level:
+                        effective_level = queued_level
+                        if effective_level >= goal_level:
+                            break
 
             if effective_level >= goal_level:
                 log.info(f"AGENT({agent.village_name}): Task '{gid_name(goal_gid)}' Lvl {goal_level} at Loc {goal_location} is already complete (Effective Lvl: {effective_level}). Removing from queue.")
-                with state_lock:
-                    BOT_STATE["build_queues"][str(agent.village_id)] = build_queue[1:]
-                save_config()
-                return 'queue_modified'
+                return self._drop_head(goal_task)
             
             if is_new_build:
                 # Last check: if we are about to build a new unique building, make sure one doesn't already exist somewhere else
-                if not is_multi_instance(goal_gid) and any(b.get('gid') == goal_gid for b in all_buildings):
+                if not is_multi_instance(goal_gid) and goal_gid in buildings_by_gid:
                     log.error(f"AGENT({agent.village_name}): Task wants to build new unique building '{gid_name(goal_gid)}' but one exists. Correcting task...")
                     # Find the existing building and update the queue item
-                    existing_building = next(b for b in all_buildings if b.get('gid') == goal_gid)
-                    with state_lock:
-                        BOT_STATE["build_queues"][str(agent.village_id)][0]['location'] = existing_building['id']
-                    save_config()
-                    return 'queue_modified'
+                    existing_building = buildings_by_gid[goal_gid][0]
+                    return self._set_head_location(goal_task, existing_building['id'])
 
-                missing_prereqs = self._resolve_dependencies(goal_gid, all_buildings)
+                missing_prereqs = self._resolve_dependencies(goal_gid, buildings_by_gid)
                 if missing_prereqs:
                     log.info(f"AGENT({agent.village_name}): Prepending prerequisites for new building {gid_name(goal_gid)}.")
-                    with state_lock:
-                        BOT_STATE["build_queues"][str(agent.village_id)] = missing_prereqs + build_queue
-                    save_config()
-                    return 'queue_modified'
+                    return self._prepend(goal_task, missing_prereqs)
                 action_plan = {'type': 'new', 'location': goal_location, 'gid': goal_gid, 'is_new': True}
             else: 
                 action_plan = {'type': 'upgrade', 'location': goal_location, 'gid': goal_gid, 'is_new': False}
 
         else:
             log.error(f"AGENT({agent.village_name}): Unknown task type '{goal_task.get('type')}'. Removing task.")
-            with state_lock:
-                BOT_STATE["build_queues"][str(agent.village_id)] = build_queue[1:]
-            save_config()
-            return 'queue_modified'
+            return self._drop_head(goal_task)
         
         if action_plan:
             if agent.use_hero_resources and hasattr(agent, 'resources_module') and agent.resources_module:
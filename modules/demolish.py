@@ -3,7 +3,7 @@ import time
 import re
 import threading
 from bs4 import BeautifulSoup
-from config import log, BOT_STATE, state_lock, save_config, gid_name
+from config import log, BOT_STATE, state_lock, schedule_save_config, gid_name
 
 class Module(threading.Thread):
     """
@@ -65,7 +65,7 @@ class Module(threading.Thread):
                          log.info(f"[DemolishAgent][{username}] Task for {village['name']} complete. Removing from queue.")
                          with state_lock:
                              BOT_STATE['demolish_queues'][village_id_str].pop(0)
-                         save_config()
+                         schedule_save_config()
                          continue
 
                     main_building = next((b for b in village_details.get('buildings', []) if b.get('gid') == 15), None)
@@ -4,7 +4,7 @@ import math
 import re
 import random
 from .base import BaseModule
-from config import log, BOT_STATE, state_lock, save_config, gid_name
+from config import log, BOT_STATE, state_lock, schedule_save_config, gid_name, mark_state_dirty
 
 class Module(BaseModule):
     """
@@ -17,11 +17,11 @@ class Module(BaseModule):
 
     def _get_loop_state(self, village_id):
         """Safely gets the state for a village, initializing if not present."""
+        village_key = str(village_id)
         with state_lock:
-            if "loop_module_state" not in BOT_STATE:
-                BOT_STATE["loop_module_state"] = {}
-            if str(village_id) not in BOT_STATE["loop_module_state"]:
-                BOT_STATE["loop_module_state"][str(village_id)] = {
+            loop_states = BOT_STATE.setdefault("loop_module_state", {})
+            if village_key not in loop_states:
+                loop_states[village_key] = {
                     "enabled": False,
                     "status": "idle",
                     "target_coords": None,
@@ -30,7 +30,8 @@ class Module(BaseModule):
                     "new_village_id": None,
                     "catapult_origin_village": None
                 }
-            return BOT_STATE["loop_module_state"][str(village_id)]
+                mark_state_dirty()
+            return loop_states[village_key]
 
     def tick(self, village_data):
         agent = self.agent
@@ -74,6 +75,7 @@ class Module(BaseModule):
         else:
             log.error(f"[{agent.village_name}] No Residence, Palace, or Command Center found to train settlers.")
             loop_state["status"] = "idle" # Reset
+            mark_state_dirty()
             return
 
         success = agent.client.train_settlers(agent.village_id, settler_building_gid, 3)
@@ -82,7 +84,7 @@ class Module(BaseModule):
             log.info(f"[{agent.village_name}] Settler training initiated.")
         else:
             log.error(f"[{agent.village_name}] Failed to initiate settler training. Retrying next cycle.")
-        save_config()
+        schedule_save_config()
 
     def check_settler_training(self, village_data, loop_state):
         """Waits for settlers to be trained."""
@@ -91,7 +93,7 @@ class Module(BaseModule):
         # For now, we assume if we are in this state, we are waiting, then proceed.
         log.info(f"[{agent.village_name}] Waiting for settlers to finish training...")
         loop_state["status"] = "finding_village"
-        save_config()
+        schedule_save_config()
 
 
     def find_and_send_settlers(self, village_data, loop_state):
@@ -103,6 +105,7 @@ class Module(BaseModule):
         if not current_coords:
             log.error(f"[{agent.village_name}] Cannot find coordinates for current village. Aborting loop.")
             loop_state["status"] = "idle"
+            mark_state_dirty()
             return
             
         # Fetch map data around the current village
@@ -139,7 +142,7 @@ class Module(BaseModule):
         else:
             log.error(f"[{agent.village_name}] Failed to send settlers.")
             loop_state["status"] = "idle" # Reset
-        save_config()
+        schedule_save_config()
         
     def check_settlement_complete(self, village_data, loop_state):
         """Checks if the new village appears in the sidebar."""
@@ -179,7 +182,7 @@ class Module(BaseModule):
             log.error(f"[{agent.village_name}] Settlement failed. New village not found. Restarting loop.")
             loop_state["status"] = "idle"
             
-        save_config()
+        schedule_save_config()
         
     def check_build_up_complete(self, village_data, loop_state):
         """Checks if the special agent for the new village is finished."""
@@ -194,7 +197,7 @@ class Module(BaseModule):
             log.info(f"[{agent.village_name}] Build-up of village {new_village_id} is complete. Starting destruction phase.")
             loop_state["status"] = "destroying"
         
-        save_config()
+        schedule_save_config()
 
     def destroy_village(self, village_data, loop_state):
         """Initiates the catapult waves to destroy the newly built village."""
@@ -214,6 +217,7 @@ class Module(BaseModule):
         if not target_village_details or 'coords' not in target_village_details:
             log.error(f"[{agent.village_name}] Cannot find coordinates for target village {new_village_id}. Aborting destruction.")
             loop_state["status"] = "idle"
+            mark_state_dirty()
             return
 
         target_coords = target_village_details['coords']
@@ -238,7 +242,7 @@ class Module(BaseModule):
             log.error(f"[{agent.village_name}] Failed to send catapult waves. Resetting loop.")
             loop_state["status"] = "idle"
             
-        save_config()
+        schedule_save_config()
 
 
     def check_destruction_complete(self, village_data, loop_state):
@@ -249,7 +253,7 @@ class Module(BaseModule):
         if not new_village_id:
             log.info(f"[{agent.village_name}] No new village ID in state. Resetting loop to idle.")
             loop_state["status"] = "idle"
-            save_config()
+            schedule_save_config()
             return
 
         log.info(f"[{agent.village_name}] Checking if village {new_village_id} has been destroyed...")
@@ -265,4 +269,4 @@ class Module(BaseModule):
         else:
             log.info(f"[{agent.village_name}] Village {new_village_id} still exists. Will check again on the next cycle.")
 
-        save_config()
\ No newline at end of file
+        schedule_save_config()
\ No newline at end of file
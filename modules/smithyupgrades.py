@@ -3,7 +3,7 @@ import time
 import re
 import threading
 from bs4 import BeautifulSoup
-from config import log, BOT_STATE, state_lock, save_config
+from config import log, BOT_STATE, state_lock, save_config, mark_state_dirty
 
 class Module(threading.Thread):
     def __init__(self, account_info, client_class):
@@ -79,6 +79,7 @@ class Module(threading.Thread):
                     
                     with state_lock:
                         BOT_STATE['smithy_data'][village_id_str] = smithy_info
+                    mark_state_dirty()
 
                     current_queue = smithy_info.get("research_queue", [])
                     max_queue = 2 if smithy_info.get("plus_account", False) else 1
@@ -4,7 +4,7 @@ import re
 import threading
 from datetime import datetime, timezone
 from bs4 import BeautifulSoup
-from config import log, BOT_STATE, state_lock, save_config
+from config import log, BOT_STATE, state_lock, schedule_save_config
 
 class Module(threading.Thread):
     """
@@ -274,9 +274,11 @@ class Module(threading.Thread):
                         if is_any_building_enabled and all_enabled_buildings_at_max_time:
                             log.info(f"[TrainingAgent] All enabled buildings in {village_name} have reached the end time duration. Disabling training for this village.")
                             with state_lock:
-                                if str(target_village_id) in BOT_STATE['training_queues']:
+                                disabled = str(target_village_id) in BOT_STATE['training_queues']
+                                if disabled:
                                     BOT_STATE['training_queues'][str(target_village_id)]['enabled'] = False
-                                    save_config()
+                            if disabled:
+                                schedule_save_config()
                             # Exit the aggressive training loop for this village as it's now disabled.
                             break
                     # --- END OF CHANGES ---
@@ -293,9 +295,11 @@ class Module(threading.Thread):
                                 
                                 log.info(f"[TrainingAgent] Increasing max queue duration for {village_name} by {step_size} to {new_duration} minutes for the next cycle.")
 
-                                if str(target_village_id) in BOT_STATE['training_queues']:
+                                duration_updated = str(target_village_id) in BOT_STATE['training_queues']
+                                if duration_updated:
                                     BOT_STATE['training_queues'][str(target_village_id)]['min_queue_duration_minutes'] = new_duration
-                                    save_config()
+                            if duration_updated:
+                                schedule_save_config()
                         else:
                             log.info(f"[TrainingAgent] Auto-increment is disabled for {village_name}. Keeping queue time the same.")
                         
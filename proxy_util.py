@@ -6,6 +6,9 @@ import time
 from concurrent.futures import ThreadPoolExecutor
 from config import log
 
+# Shared across calls instead of spinning up a new pool for every proxy check
+_PROXY_CHECK_POOL = ThreadPoolExecutor(max_workers=10, thread_name_prefix="proxy-check")
+
 def parse_proxy_file(file_path="proxies.txt"):
     """Parses the proxy file and returns a list of proxy dictionaries."""
     proxies = []
@@ -53,8 +56,7 @@ def get_fastest_proxies(num_to_check=10, num_to_return=3):
     else:
         proxies_to_check = random.sample(proxies, num_to_check)
     
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        results = list(executor.map(check_proxy_speed, proxies_to_check))
+    results = list(_PROXY_CHECK_POOL.map(check_proxy_speed, proxies_to_check))
 
     # Filter out failed proxies and sort by speed
     successful_proxies = [res for res in results if res and res[1] != float('inf')]
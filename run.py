@@ -2,9 +2,12 @@ import eventlet
 eventlet.monkey_patch()
 
 from dashboard import app, socketio
-from config import load_config, log
+from config import load_config, flush_config, log
 
 if __name__ == "__main__":
     load_config()
     log.info("Dashboard available at http://127.0.0.1:5000")
-    socketio.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
+    try:
+        socketio.run(app, host="0.0.0.0", port=5000)
+    finally:
+        flush_config()
\ No newline at end of file
@@ -0,0 +1,140 @@
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+# ─────────────────────────────────────────
+# Minimal stand-ins for third-party packages that may be missing in CI.
+# Only installed when the real package cannot be imported; the tests never
+# touch the network or parse real HTML through them.
+# ─────────────────────────────────────────
+def _missing(name):
+    try:
+        __import__(name)
+        return False
+    except ImportError:
+        return True
+
+
+def _install_requests():
+    requests = types.ModuleType("requests")
+    adapters = types.ModuleType("requests.adapters")
+
+    class RequestException(Exception):
+        pass
+
+    class Session:
+        def __init__(self):
+            self.headers = {}
+            self.proxies = {}
+            self.adapters = {}
+
+        def mount(self, prefix, adapter):
+            self.adapters[prefix] = adapter
+
+        def get(self, url, **kwargs):
+            raise RequestException("network access is not available in tests")
+
+        post = get
+
+    class HTTPAdapter:
+        def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=0, **kwargs):
+            self.max_retries = max_retries
+
+    def get(url, **kwargs):
+        raise RequestException("network access is not available in tests")
+
+    requests.RequestException = RequestException
+    requests.Session = Session
+    requests.get = get
+    requests.post = get
+    requests.adapters = adapters
+    adapters.HTTPAdapter = HTTPAdapter
+    sys.modules["requests"] = requests
+    sys.modules["requests.adapters"] = adapters
+
+
+def _install_urllib3():
+    urllib3 = types.ModuleType("urllib3")
+    util = types.ModuleType("urllib3.util")
+    retry = types.ModuleType("urllib3.util.retry")
+
+    class Retry:
+        def __init__(self, total=10, connect=None, read=None, status=None, backoff_factor=0, **kwargs):
+            self.total = total
+            self.connect = connect
+            self.read = read
+            self.status = status
+            self.backoff_factor = backoff_factor
+
+    retry.Retry = Retry
+    util.retry = retry
+    urllib3.util = util
+    sys.modules["urllib3"] = urllib3
+    sys.modules["urllib3.util"] = util
+    sys.modules["urllib3.util.retry"] = retry
+
+
+def _install_bs4():
+    bs4 = types.ModuleType("bs4")
+
+    class BeautifulSoup:
+        def __init__(self, markup="", *args, **kwargs):
+            self.markup = markup
+
+        def find(self, *args, **kwargs):
+            return None
+
+        def find_all(self, *args, **kwargs):
+            return []
+
+        def select(self, *args, **kwargs):
+            return []
+
+        def select_one(self, *args, **kwargs):
+            return None
+
+    class SoupStrainer:
+        def __init__(self, *args, **kwargs):
+            pass
+
+    bs4.BeautifulSoup = BeautifulSoup
+    bs4.SoupStrainer = SoupStrainer
+    sys.modules["bs4"] = bs4
+
+
+def _install_soupsieve():
+    soupsieve = types.ModuleType("soupsieve")
+    soupsieve.compile = lambda pattern, *args, **kwargs: types.SimpleNamespace(pattern=pattern)
+    sys.modules["soupsieve"] = soupsieve
+
+
+for _name, _install in (("requests", _install_requests), ("urllib3", _install_urllib3),
+                        ("bs4", _install_bs4), ("soupsieve", _install_soupsieve)):
+    if _missing(_name):
+        _install()
+
+
+@pytest.fixture(autouse=True)
+def _repo_cwd(monkeypatch):
+    # Modules read prerequisites.json and the build order relative to the working directory
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def bot_state():
+    """BOT_STATE emptied for the test and restored afterwards (modules hold references to the dict)."""
+    import copy
+    from config import BOT_STATE
+    saved = copy.deepcopy(BOT_STATE)
+    for key in BOT_STATE:
+        BOT_STATE[key] = [] if key == "accounts" else {}
+    yield BOT_STATE
+    BOT_STATE.clear()
+    BOT_STATE.update(saved)
@@ -0,0 +1,142 @@
+import types
+
+import pytest
+
+from modules import building
+
+
+class _StubClient:
+    def __init__(self):
+        self.builds = []
+
+    def initiate_build(self, village_id, slot_id, gid, is_new_build):
+        self.builds.append((slot_id, gid, is_new_build))
+        return {"status": "success", "eta": 120}
+
+
+@pytest.fixture
+def saves(monkeypatch):
+    calls = []
+    monkeypatch.setattr(building, "schedule_save_config", lambda: calls.append(1))
+    return calls
+
+
+@pytest.fixture
+def module(bot_state, saves):
+    agent = types.SimpleNamespace(
+        village_id=100, village_key="100", village_name="Capital",
+        use_hero_resources=False, resources_module=None, client=_StubClient(),
+    )
+    return building.Module(agent)
+
+
+def _village(buildings, queue=()):
+    return {"buildings": list(buildings), "queue": list(queue)}
+
+
+def _fields(level):
+    return [{"id": i, "gid": 1, "level": level} for i in range(1, 19)]
+
+
+def test_pinned_task_already_complete_is_dropped(module, bot_state, saves):
+    task = {"type": "building", "gid": 15, "level": 3, "location": 26}
+    bot_state["build_queues"]["100"] = [task, {"type": "building", "gid": 10, "level": 1}]
+
+    result = module.tick(_village([{"id": 26, "gid": 15, "level": 5}]))
+
+    assert result == "queue_modified"
+    assert bot_state["build_queues"]["100"] == [{"type": "building", "gid": 10, "level": 1}]
+    assert saves == [1]
+    assert module.agent.client.builds == []
+
+
+def test_upgrade_counts_server_queue_levels(module, bot_state, saves):
+    task = {"type": "building", "gid": 15, "level": 3, "location": 26}
+    bot_state["build_queues"]["100"] = [task]
+
+    result = module.tick(_village([{"id": 26, "gid": 15, "level": 2}],
+                                  queue=[{"name": "Main Building Level 3", "level": 3}]))
+
+    assert result == "queue_modified"
+    assert bot_state["build_queues"]["100"] == []
+
+
+def test_upgrade_starts_build(module, bot_state, saves):
+    bot_state["build_queues"]["100"] = [{"type": "building", "gid": 15, "level": 3, "location": 26}]
+
+    result = module.tick(_village([{"id": 26, "gid": 15, "level": 1}]))
+
+    assert result == 120
+    assert module.agent.client.builds == [(26, 15, False)]
+    assert saves == []
+
+
+def test_drop_head_leaves_replaced_queue_alone(module, bot_state, saves):
+    stale = {"type": "building", "gid": 15, "level": 3, "location": 26}
+    fresh = {"type": "building", "gid": 10, "level": 1}
+    bot_state["build_queues"]["100"] = [fresh]
+
+    assert module._drop_head(stale) == 0
+    assert module._prepend(stale, [{"type": "building", "gid": 11, "level": 1}]) == 0
+    assert module._set_head_location(stale, 30) == 0
+    assert bot_state["build_queues"]["100"] == [fresh]
+    assert stale["location"] == 26
+    assert saves == []
+
+
+def test_missing_prerequisites_are_prepended(module, bot_state, saves):
+    task = {"type": "building", "gid": 17, "level": 1, "location": 30}
+    bot_state["build_queues"]["100"] = [task]
+    buildings = [{"id": 26, "gid": 15, "level": 3}, {"id": 27, "gid": 10, "level": 0},
+                 {"id": 30, "gid": 0, "level": 0}]
+
+    result = module.tick(_village(buildings))
+
+    assert result == "queue_modified"
+    assert bot_state["build_queues"]["100"] == [
+        {"type": "building", "location": 27, "gid": 10, "level": 1},
+        {"type": "building", "gid": 11, "level": 1},
+        task,
+    ]
+
+
+def test_unplaced_task_gets_an_empty_slot(module, bot_state, saves):
+    task = {"type": "building", "gid": 10, "level": 1}
+    bot_state["build_queues"]["100"] = [task]
+    buildings = [{"id": 19, "gid": 15, "level": 1}, {"id": 20, "gid": 0, "level": 0},
+                 {"id": 39, "gid": 0, "level": 0}]
+
+    assert module.tick(_village(buildings)) == "queue_modified"
+    assert task["location"] == 20
+
+
+def test_resource_plan_wait_is_cached(module, bot_state, saves, monkeypatch):
+    bot_state["build_queues"]["100"] = [{"type": "resource_plan", "level": 2}]
+    active = [{"name": "Woodcutter Level 1", "level": 1}]
+
+    assert module.tick(_village(_fields(0), queue=active)) == 0
+    assert module._wait_cache is not None
+
+    # Same head and server queue length: the decision is reused without scanning the fields
+    lookups = []
+    real_gid_name = building.gid_name
+    monkeypatch.setattr(building, "gid_name", lambda gid: lookups.append(gid) or real_gid_name(gid))
+    assert module.tick(_village(_fields(0), queue=active)) == 0
+    assert lookups == []
+
+    # The server queue shrank, so the plan is evaluated again and a field gets upgraded
+    assert module.tick(_village(_fields(0))) == 120
+    assert module.agent.client.builds == [(1, 1, False)]
+
+
+def test_resource_plan_complete_is_dropped(module, bot_state, saves):
+    bot_state["build_queues"]["100"] = [{"type": "resource_plan", "level": 2}]
+
+    assert module.tick(_village(_fields(2))) == "queue_modified"
+    assert bot_state["build_queues"]["100"] == []
+
+
+def test_prerequisites_are_shared_between_modules(module):
+    other = building.Module(module.agent)
+    assert other._prereqs is module._prereqs
+    assert module.get_prerequisites(17) == ((10, 1), (11, 1), (15, 3))
@@ -0,0 +1,78 @@
+import client
+from client import TravianClient
+
+
+class _Response:
+    def __init__(self, text, status_code=200, etag=None):
+        self.text = text
+        self.content = text.encode()
+        self.status_code = status_code
+        self.headers = {"ETag": etag} if etag else {}
+
+
+class _StubSession:
+    """Replays queued responses and records the request headers."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent_headers = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.sent_headers.append(headers or {})
+        return self.responses.pop(0)
+
+
+def _client():
+    return TravianClient("player", "secret", "https://ts1.example.com/")
+
+
+def test_init_sets_session_attributes():
+    c = _client()
+    assert c.server_url == "https://ts1.example.com"
+    assert c.logged_in_at is None
+    assert c._page_cache == {}
+    assert set(c.sess.adapters) >= {"http://", "https://"}
+    retry = c.sess.adapters["https://"].max_retries
+    assert retry.read == 0 and retry.status == 0
+
+
+def test_fetch_and_parse_page_reuses_parse(monkeypatch):
+    c = _client()
+    parses = []
+
+    def fake_parse(html, page_type):
+        parses.append(html)
+        return {"buildings": [{"id": 19, "gid": 15, "level": len(parses)}]}
+
+    monkeypatch.setattr(c, "parse_village_page", fake_parse)
+    c.sess = _StubSession([
+        _Response("<html>a</html>", etag='"v1"'),
+        _Response("", status_code=304),
+        _Response("<html>a</html>"),
+        _Response("<html>b</html>"),
+    ])
+    url = "https://ts1.example.com/dorf2.php?newdid=1"
+
+    first = c._fetch_and_parse_page(url, "dorf2")
+    assert first["buildings"][0]["level"] == 1
+    assert c.sess.sent_headers[0] == {}
+
+    # 304 and identical bytes both return the cached parse without re-parsing
+    assert c._fetch_and_parse_page(url, "dorf2") == first
+    assert c.sess.sent_headers[1] == {"If-None-Match": '"v1"'}
+    assert c._fetch_and_parse_page(url, "dorf2") == first
+    assert len(parses) == 1
+
+    # Callers get copies, so mutating a result does not leak into the cache
+    first["buildings"].clear()
+    changed = c._fetch_and_parse_page(url, "dorf2")
+    assert len(parses) == 2
+    assert changed["buildings"][0]["level"] == 2
+
+
+def test_ensure_logged_in_on_fresh_client(monkeypatch):
+    c = _client()
+    calls = []
+    monkeypatch.setattr(c, "login", lambda *a, **k: calls.append(1) or True)
+    c.ensure_logged_in()
+    assert calls == [1]
@@ -0,0 +1,62 @@
+import json
+import types
+
+import bot
+
+
+def _collector():
+    # Only _sent_hashes is used, so a full BotManager (with its agents and threads) isn't needed
+    manager = types.SimpleNamespace(_sent_hashes={})
+    return lambda: bot.BotManager._collect_state_deltas(manager)
+
+
+def _events(updates):
+    return [(event, json.loads(payload)) for event, payload in updates]
+
+
+def test_first_collect_sends_every_piece(bot_state):
+    bot_state["accounts"].append({"username": "player"})
+    bot_state["village_data"]["100"] = {"buildings": []}
+    bot_state["build_queues"]["100"] = [{"type": "building", "gid": 15, "level": 2}]
+    collect = _collector()
+
+    events = _events(collect())
+
+    assert ("accounts_update", [{"username": "player"}]) in events
+    assert ("village_update", {"village_id": "100", "data": {"buildings": []}}) in events
+    assert ("state_patch", {"key": "build_queues", "data": {"100": [{"type": "building", "gid": 15, "level": 2}]}}) in events
+    assert len(events) == len(bot_state) - 1 + len(bot_state["village_data"])
+
+
+def test_unchanged_state_sends_nothing(bot_state):
+    bot_state["village_data"]["100"] = {"buildings": []}
+    collect = _collector()
+    collect()
+
+    assert collect() == []
+
+
+def test_only_changed_pieces_are_sent(bot_state):
+    bot_state["village_data"]["100"] = {"buildings": []}
+    bot_state["village_data"]["200"] = {"buildings": []}
+    collect = _collector()
+    collect()
+
+    bot_state["village_data"]["200"]["buildings"].append({"id": 19, "gid": 15, "level": 1})
+    bot_state["build_queues"]["100"] = []
+
+    events = _events(collect())
+
+    assert sorted(event for event, _ in events) == ["state_patch", "village_update"]
+    assert ("village_update", {"village_id": "200", "data": {"buildings": [{"id": 19, "gid": 15, "level": 1}]}}) in events
+    assert ("state_patch", {"key": "build_queues", "data": {"100": []}}) in events
+
+
+def test_removed_village_is_sent_as_null(bot_state):
+    bot_state["village_data"]["100"] = {"buildings": []}
+    collect = _collector()
+    collect()
+
+    del bot_state["village_data"]["100"]
+
+    assert _events(collect()) == [("village_update", {"village_id": "100", "data": None})]
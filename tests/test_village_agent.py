@@ -0,0 +1,22 @@
+import bot
+
+
+class _StubClient:
+    def __init__(self, username, password, server_url, proxy=None):
+        self.username = username
+        self.server_url = server_url
+        self.proxy = proxy
+
+
+def test_village_agent_constructs(monkeypatch):
+    monkeypatch.setattr(bot, "TravianClient", _StubClient)
+    account = {"username": "player", "password": "secret", "server_url": "https://ts1.example.com"}
+    village = {"id": 12345, "name": "Capital"}
+
+    agent = bot.VillageAgent(account, village, socketio_instance=None)
+
+    assert agent.village_id == 12345
+    assert agent.village_key == "12345"
+    assert agent.village_name == "Capital"
+    assert agent.building_module is not None
+    assert not agent.is_alive()